@@ -27,11 +27,13 @@ num_labels = 10  # Adjust based on the dataset
 model = GenreClassificationModel(num_labels)
 
 # Construct dataset from Upstash Vector Database
+# In tensor output mode each batch is decoded into a single [batch, 1024] tensor and the transform is applied to the whole batch
 dataset = upstash_dataset.VectorDataset(
     index,
     "movies",
     id_mapping=lambda x: f'movie_{x}',
-    transform=lambda x: {"genre": torch.tensor(x.metadata["genre"]), "embedding": torch.tensor(x.vector)}
+    transform=lambda x: {"genre": torch.tensor([m["genre"] for m in x.metadata]), "embedding": x.vectors},
+    output="tensor",
 )
 
 # Split dataset into training and evaluation sets
@@ -40,8 +42,8 @@ eval_size = len(dataset) - train_size
 train_dataset, eval_dataset = random_split(dataset, [train_size, eval_size])
 
 # Create DataLoaders
-train_loader = DataLoader(train_dataset, batch_size=16, shuffle=True, num_workers=1)
-eval_loader = DataLoader(eval_dataset, batch_size=16, shuffle=False, num_workers=1)
+train_loader = DataLoader(train_dataset, batch_size=16, shuffle=True, num_workers=1, collate_fn=upstash_dataset.batch_collate)
+eval_loader = DataLoader(eval_dataset, batch_size=16, shuffle=False, num_workers=1, collate_fn=upstash_dataset.batch_collate)
 
 # Define optimizer and loss function
 optimizer = optim.Adam(model.parameters(), lr=2e-5, weight_decay=0.01)
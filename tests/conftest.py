@@ -1,5 +1,6 @@
 import pytest
 import upstash_redis
+import upstash_redis.asyncio
 import upstash_vector
 
 @pytest.fixture
@@ -8,4 +9,12 @@ def redis():
 
 @pytest.fixture
 def index():
-    return upstash_vector.Index.from_env()
\ No newline at end of file
+    return upstash_vector.Index.from_env()
+
+@pytest.fixture
+def async_redis():
+    return upstash_redis.asyncio.Redis.from_env()
+
+@pytest.fixture
+def async_index():
+    return upstash_vector.AsyncIndex.from_env()
\ No newline at end of file
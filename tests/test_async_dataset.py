@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+import upstash_redis
+import upstash_redis.asyncio
+import upstash_vector
+from upstash_vector.types import FetchResult
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis, index: upstash_vector.Index):
+    redis.lpush('test_async_dataset', 'lorem', 'asd', 'test')
+    index.upsert([
+        upstash_vector.types.Vector(id="test_vector_1", vector=[1, 0, 0]),
+        upstash_vector.types.Vector(id="test_vector_2", vector=[0, 1, 0]),
+    ], namespace="test_async_namespace")
+    yield
+    redis.delete("test_async_dataset")
+    index.delete_namespace("test_async_namespace")
+
+
+def test_async_list_dataset(async_redis: upstash_redis.asyncio.Redis):
+    dataset = upstash_dataset.AsyncRedisListDataset(async_redis, 'test_async_dataset')
+
+    async def run():
+        assert await dataset.alen() == 3
+        assert await dataset.aget_item(1) == 'asd'
+        assert await dataset.aget_items((0, 2, 1)) == ['test', 'lorem', 'asd']
+        assert [batch async for batch in dataset.aiter_batches([[0], [2, 1]], concurrency=2)] == [['test'], ['lorem', 'asd']]
+
+    asyncio.run(run())
+    with pytest.raises(TypeError):
+        len(dataset)
+
+def test_async_vector_dataset(async_index: upstash_vector.AsyncIndex):
+    dataset = upstash_dataset.AsyncVectorDataset(async_index, namespace="test_async_namespace", id_mapping=lambda x: f'test_vector_{x+1}')
+
+    async def run():
+        assert await dataset.alen() == 2
+        assert await dataset.aget_items((1, 0)) == [FetchResult(id="test_vector_2", vector=[0, 1, 0]), FetchResult(id="test_vector_1", vector=[1, 0, 0])]
+
+    asyncio.run(run())
+
+def test_async_chunker(async_redis: upstash_redis.asyncio.Redis):
+    chunker = upstash_dataset.AdaptiveChunker(initial_chunk_size=1, max_concurrency=2)
+    dataset = upstash_dataset.AsyncRedisListDataset(async_redis, 'test_async_dataset', chunker=chunker)
+
+    async def run():
+        assert await dataset.aget_items((2, 0, 2, 1)) == ['lorem', 'test', 'lorem', 'asd']
+
+    asyncio.run(run())
+    assert chunker.chunk_size() > 1
@@ -0,0 +1,16 @@
+import upstash_dataset
+from upstash_dataset import Benchmark
+
+
+def test_local_server():
+    with upstash_dataset.LocalUpstashServer() as server:
+        server.load_list('test_local_server', ['test', 'asd', 'lorem'])
+        dataset = upstash_dataset.RedisListDataset(server.redis(), 'test_local_server')
+        assert len(dataset) == 3
+        assert dataset.__getitems__((0, 2, 1)) == ['test', 'lorem', 'asd']
+        assert server.stats()['requests'] == 2
+
+def test_run_suite():
+    results = Benchmark.run_suite(datasets=['list', 'vector'], batch_sizes=[4], workers=[0], samplers=['random'], sample_sizes=[16], num_samples=16)
+    assert [r['dataset'] for r in results] == ['list', 'vector']
+    assert all(r['batches'] == 4 and r['requests_per_batch'] == 1 for r in results)
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+import upstash_redis
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.lpush('test_cached_dataset', 'lorem', 'asd', 'test')
+    redis.json.set('test_cached_dataset_records', '$', [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}])
+    redis.set('test_cached_dataset:0', 'test')
+    redis.set('test_cached_dataset:1', 'asd')
+    redis.set('test_cached_other:1', 'lorem')
+    yield
+    redis.delete("test_cached_dataset", "test_cached_dataset_records", 'test_cached_dataset:0', 'test_cached_dataset:1', 'test_cached_other:1')
+
+
+def test_cached_dataset(redis: upstash_redis.Redis, tmp_path):
+    dataset = upstash_dataset.CachedDataset(upstash_dataset.RedisListDataset(redis, 'test_cached_dataset'), str(tmp_path))
+    assert len(dataset) == 3
+    assert dataset[0] == 'test'
+    assert dataset.__getitems__((0, 2, 1)) == ['test', 'lorem', 'asd']
+    redis.delete("test_cached_dataset")
+    assert dataset.__getitems__((0, 2, 1)) == ['test', 'lorem', 'asd']
+
+def test_transform(redis: upstash_redis.Redis, tmp_path):
+    dataset = upstash_dataset.CachedDataset(upstash_dataset.RedisListDataset(redis, 'test_cached_dataset', transform=lambda x: {'text': x}), str(tmp_path))
+    assert dataset[1] == {'text': 'asd'}
+    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
+    assert upstash_dataset.CachedDataset(upstash_dataset.RedisListDataset(redis, 'test_cached_dataset'), str(tmp_path))[1] == 'asd'
+
+def test_eviction(redis: upstash_redis.Redis, tmp_path):
+    dataset = upstash_dataset.CachedDataset(upstash_dataset.RedisListDataset(redis, 'test_cached_dataset'), str(tmp_path), max_bytes=0, shard_size=1)
+    assert dataset.__getitems__((0, 2, 1)) == ['test', 'lorem', 'asd']
+    assert not list(tmp_path.glob('*/*.bin'))
+
+def test_json_array_fields(redis: upstash_redis.Redis, tmp_path):
+    records = upstash_dataset.CachedDataset(upstash_dataset.RedisJsonArrayDataset(redis, 'test_cached_dataset_records'), str(tmp_path))
+    projected = upstash_dataset.CachedDataset(upstash_dataset.RedisJsonArrayDataset(redis, 'test_cached_dataset_records', fields=['b']), str(tmp_path))
+    assert records.__getitems__((0, 1)) == [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]
+    assert projected.__getitems__((0, 1)) == [{'b': 2}, {'b': 4}]
+
+def test_identity(redis: upstash_redis.Redis, tmp_path):
+    strings = upstash_dataset.CachedDataset(upstash_dataset.RedisStringDataset(redis, 'test_cached_dataset:{}'.format, lambda: 2), str(tmp_path))
+    other = upstash_dataset.CachedDataset(upstash_dataset.RedisStringDataset(redis, lambda i: 'test_cached_dataset:0' if i == 0 else f'test_cached_other:{i}', lambda: 2), str(tmp_path))
+    assert strings.__getitems__((0, 1)) == ['test', 'asd']
+    assert other.__getitems__((0, 1)) == ['test', 'lorem']
+    elsewhere = upstash_redis.Redis('http://127.0.0.1:1', 'token')
+    assert upstash_dataset.RedisListDataset(elsewhere, 'test_cached_dataset')._identity() != upstash_dataset.RedisListDataset(redis, 'test_cached_dataset')._identity()
+
+def test_eviction_scans(redis: upstash_redis.Redis, tmp_path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: scans.append(path) or scandir(path))
+    dataset = upstash_dataset.CachedDataset(upstash_dataset.RedisListDataset(redis, 'test_cached_dataset'), str(tmp_path), shard_size=1)
+    for i in range(3):
+        assert dataset[i] == ['test', 'asd', 'lorem'][i]
+    assert len(scans) == 1
@@ -0,0 +1,41 @@
+import pickle
+
+import pytest
+import upstash_redis
+import upstash_vector
+from torch.utils.data import DataLoader
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.rpush('test_clients', 'test', 'asd', 'lorem', 'ipsum')
+    yield
+    redis.delete('test_clients')
+
+
+def test_pickle(redis: upstash_redis.Redis, index: upstash_vector.Index):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_clients')
+    assert dataset[0] == 'test'
+    copy = pickle.loads(pickle.dumps(dataset))
+    assert copy.__getitems__((3, 1)) == ['ipsum', 'asd']
+    vector_dataset = pickle.loads(pickle.dumps(upstash_dataset.VectorDataset(index)))
+    assert vector_dataset._id_mapping(1) == '1'
+
+def test_new_client():
+    closed = upstash_redis.Redis.from_env()
+    assert upstash_dataset.RedisListDataset(closed, 'test_clients')[0] == 'test'
+    closed.close()
+    other = upstash_redis.Redis.from_env()
+    dataset = upstash_dataset.RedisListDataset(other, 'test_clients')
+    assert dataset._redis.client() is other
+    assert dataset.__getitems__((1, 2)) == ['asd', 'lorem']
+
+@pytest.mark.parametrize('context', ['fork', 'spawn'])
+def test_workers(redis: upstash_redis.Redis, context: str):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_clients')
+    # The client is used in the main process before the workers start
+    assert len(dataset) == 4
+    loader = DataLoader(dataset, batch_size=2, num_workers=2, multiprocessing_context=context, persistent_workers=True, collate_fn=upstash_dataset.batch_collate)
+    for _ in range(2):
+        assert [sample for batch in loader for sample in batch] == ['test', 'asd', 'lorem', 'ipsum']
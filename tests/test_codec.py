@@ -0,0 +1,39 @@
+import pickle
+
+import pytest
+import torch
+import upstash_redis
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    yield
+    redis.delete('test_codec', *[f'test_codec:{i}' for i in range(3)])
+
+
+def test_array_codec(redis: upstash_redis.Redis):
+    codec = upstash_dataset.ArrayCodec(torch.float32, shape=(2, 2))
+    values = [torch.full((2, 2), float(i)) for i in range(3)]
+    assert upstash_dataset.write_list(redis, 'test_codec', values, codec, chunk_size=2) == 3
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_codec', codec=codec)
+    batch = dataset.__getitems__((2, 0))
+    assert batch.shape == (2, 2, 2)
+    assert torch.equal(batch, torch.stack([values[2], values[0]]))
+    assert torch.equal(dataset[1], values[1])
+    assert torch.equal(pickle.loads(pickle.dumps(codec)).decode(codec.encode(values[1])), values[1])
+
+def test_strings(redis: upstash_redis.Redis):
+    codec = upstash_dataset.ArrayCodec(torch.int64)
+    values = [[1, 2, 3], [4, 5], [6]]
+    assert upstash_dataset.write_strings(redis, 'test_codec:{}'.format, values, codec) == 3
+    dataset = upstash_dataset.RedisStringDataset(redis, 'test_codec:{}'.format, lambda: 3, transform=lambda x: x.sum(), codec=codec)
+    assert dataset.__getitems__((0, 1, 2)) == [6, 9, 6]
+    assert dataset[1] == 9
+
+def test_batch_transform(redis: upstash_redis.Redis):
+    codec = upstash_dataset.ArrayCodec(torch.float32, shape=(2,))
+    upstash_dataset.write_list(redis, 'test_codec', [torch.tensor([float(i), 1.0]) for i in range(3)], codec)
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_codec', transform=lambda x: x * 2, codec=codec, batch_transform=torch.stack)
+    assert torch.equal(dataset.__getitems__((0, 2)), torch.tensor([[0.0, 2.0], [4.0, 2.0]]))
+    assert torch.equal(dataset[1], torch.tensor([2.0, 2.0]))
@@ -0,0 +1,28 @@
+import pickle
+
+import pytest
+import upstash_redis
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.set('test_key_index_2', 'asd')
+    redis.set('test_key_index_1', 'test')
+    redis.set('test_key_index_3', 'lorem')
+    yield
+    redis.delete('test_key_index_1', 'test_key_index_2', 'test_key_index_3')
+
+
+def test_key_index(redis: upstash_redis.Redis, tmp_path):
+    key_index = upstash_dataset.KeyIndex.build(redis, str(tmp_path / 'keys.idx'), match='test_key_index_*', chunk_size=2)
+    assert len(key_index) == 3
+    assert [key_index(i) for i in range(3)] == ['test_key_index_1', 'test_key_index_2', 'test_key_index_3']
+    assert pickle.loads(pickle.dumps(key_index))(-1) == 'test_key_index_3'
+
+def test_string_dataset(redis: upstash_redis.Redis, tmp_path):
+    upstash_dataset.KeyIndex.build(redis, str(tmp_path / 'keys.idx'), match='test_key_index_*')
+    key_index = upstash_dataset.KeyIndex(str(tmp_path / 'keys.idx'))
+    dataset = upstash_dataset.RedisStringDataset(redis, key_mapping=key_index, length_function=key_index.length)
+    assert len(dataset) == 3
+    assert dataset.__getitems__((0, 2, 1)) == ['test', 'lorem', 'asd']
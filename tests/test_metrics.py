@@ -0,0 +1,37 @@
+import json
+
+import pytest
+import upstash_redis
+from torch.utils.data import DataLoader
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.lpush('test_metrics', 'lorem', 'asd', 'test')
+    yield
+    redis.delete("test_metrics")
+
+
+def test_metrics(redis: upstash_redis.Redis, tmp_path):
+    metrics = upstash_dataset.Metrics()
+    dataset = upstash_dataset.CachedDataset(upstash_dataset.RedisListDataset(redis, 'test_metrics', metrics=metrics), str(tmp_path), metrics=metrics)
+    assert dataset.__getitems__((0, 2)) == ['test', 'lorem']
+    assert dataset.__getitems__((0, 1)) == ['test', 'asd']
+    counters = metrics.collect()['total']['counters']
+    assert counters['requests'] == 2
+    assert counters['samples'] == 4
+    assert counters['cache_hits'] == 1
+    assert counters['cache_misses'] == 3
+
+def test_workers(redis: upstash_redis.Redis, tmp_path):
+    metrics = upstash_dataset.Metrics(str(tmp_path / 'metrics'), trace=True)
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_metrics', metrics=metrics)
+    assert list(DataLoader(dataset, batch_sampler=[[0], [1], [2]], num_workers=2, collate_fn=lambda x: x)) == [['test'], ['asd'], ['lorem']]
+    collected = metrics.collect()
+    assert collected['total']['counters']['requests'] == 3
+    assert len(collected['workers']) == 3
+    metrics.write_trace(str(tmp_path / 'trace.json'))
+    with open(tmp_path / 'trace.json') as f:
+        events = json.load(f)['traceEvents']
+    assert len([e for e in events if e['name'] == 'exec']) == 3
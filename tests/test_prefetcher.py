@@ -0,0 +1,33 @@
+import pytest
+import upstash_redis
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.lpush('test_prefetcher', 'lorem', 'asd', 'test')
+    yield
+    redis.delete("test_prefetcher")
+
+
+def test_prefetch_loader(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_prefetcher')
+    loader = upstash_dataset.PrefetchLoader(dataset, batch_sampler=[[0, 2], [1], [2, 1, 0]], prefetch_batches=2, collate_fn=None)
+    assert len(loader) == 3
+    assert list(loader) == [['test', 'lorem'], ['asd'], ['lorem', 'asd', 'test']]
+
+def test_batch_size(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_prefetcher', transform=lambda x: {'text': x})
+    loader = upstash_dataset.PrefetchLoader(dataset, batch_size=2)
+    assert list(loader) == [{'text': ['test', 'asd']}, {'text': ['lorem']}]
+
+
+def test_batch_transform(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_prefetcher', transform=str.upper)
+    loader = upstash_dataset.PrefetchLoader(dataset, batch_sampler=[[0, 2], [1], [2, 1, 0]], collate_fn=None, batch_transform=' '.join, transform_workers=2)
+    assert list(loader) == ['TEST LOREM', 'ASD', 'LOREM ASD TEST']
+
+def test_process_pool(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_prefetcher')
+    loader = upstash_dataset.PrefetchLoader(dataset, batch_size=2, collate_fn=None, batch_transform=sorted, transform_workers=1, transform_pool='process')
+    assert list(loader) == [['asd', 'test'], ['lorem']]
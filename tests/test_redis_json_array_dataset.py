@@ -6,8 +6,9 @@ import upstash_dataset
 @pytest.fixture(autouse=True)
 def setup_index(redis: upstash_redis.Redis):
     redis.json.set('test_redis_json_array', '$', {"array": ['test', 'asd', 'lorem']})
+    redis.json.set('test_redis_json_array_records', '$', {"array": [{"text": 'test', "label": 0, "meta": {"id": 'a'}}, {"text": 'asd', "label": 1, "meta": {"id": 'b'}}, {"text": 'lorem', "label": 2, "meta": {"id": 'c'}}]})
     yield
-    redis.delete("test_redis_json_array")
+    redis.delete("test_redis_json_array", "test_redis_json_array_records")
 
 
 def test_json_array_dataset(redis: upstash_redis.Redis):
@@ -23,4 +24,16 @@ def test_transform(redis: upstash_redis.Redis):
     assert dataset[0] == {'text': 'test'}
     assert dataset[1] == {'text': 'asd'}
     assert dataset[2] == {'text': 'lorem'}
-    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
\ No newline at end of file
+    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
+
+def test_slices(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisJsonArrayDataset(redis, 'test_redis_json_array', '$.array')
+    assert dataset.__getitems__((2, 0, 1, 0)) == ['lorem', 'test', 'asd', 'test']
+    assert dataset[-1] == 'lorem'
+    with pytest.raises(IndexError):
+        dataset.__getitems__((1, 3))
+
+def test_fields(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisJsonArrayDataset(redis, 'test_redis_json_array_records', '$.array', fields=['label', 'meta.id'], gap_tolerance=1)
+    assert dataset[1] == {'label': 1, 'meta.id': 'b'}
+    assert dataset.__getitems__((2, 0)) == [{'label': 2, 'meta.id': 'c'}, {'label': 0, 'meta.id': 'a'}]
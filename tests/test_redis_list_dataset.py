@@ -1,5 +1,6 @@
 import pytest
 import upstash_redis
+from torch.utils.data import DataLoader
 
 import upstash_dataset
 
@@ -23,4 +24,27 @@ def test_transform(redis: upstash_redis.Redis):
     assert dataset[0] == {'text': 'test'}
     assert dataset[1] == {'text': 'asd'}
     assert dataset[2] == {'text': 'lorem'}
-    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
\ No newline at end of file
+    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
+
+def test_gap_tolerance(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_redis_list_dataset', gap_tolerance=1)
+    assert dataset.__getitems__((2, 0, 0)) == ['lorem', 'test', 'test']
+    assert dataset.__getitems__((1, 5, -1)) == ['asd', None, 'lorem']
+
+def test_length_cache(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_redis_list_dataset')
+    uncached_dataset = upstash_dataset.RedisListDataset(redis, 'test_redis_list_dataset', length_ttl=0)
+    assert len(dataset) == 3
+    redis.rpush('test_redis_list_dataset', 'ipsum')
+    assert len(dataset) == 3
+    assert len(uncached_dataset) == 4
+    dataset.set_epoch(1)
+    assert len(dataset) == 4
+
+def test_chunker(redis: upstash_redis.Redis):
+    chunker = upstash_dataset.AdaptiveChunker(initial_chunk_size=1, max_chunk_size=1, max_concurrency=2)
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_redis_list_dataset', chunker=chunker)
+    assert dataset.__getitems__((0, 2, 1, 2)) == ['test', 'lorem', 'asd', 'lorem']
+    # Forked workers inherit the pool created above without its threads
+    loader = DataLoader(dataset, batch_sampler=[[0, 1], [2, 1]], num_workers=2, multiprocessing_context='fork', timeout=10, collate_fn=lambda x: x)
+    assert list(loader) == [['test', 'asd'], ['lorem', 'asd']]
@@ -23,4 +23,30 @@ def test_transform(redis: upstash_redis.Redis):
     assert dataset[0] == {'text': 'test'}
     assert dataset[1] == {'text': 'asd'}
     assert dataset[2] == {'text': 'lorem'}
-    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
\ No newline at end of file
+    assert dataset.__getitems__((0, 2, 1)) == [{'text': 'test'}, {'text': 'lorem'}, {'text': 'asd'}]
+
+def test_gap_tolerance(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetDataset(redis, 'test_redis_sortedset_keys', gap_tolerance=1)
+    assert dataset.__getitems__((2, 0, 0)) == [('lorem', 3.0), ('test', 1.0), ('test', 1.0)]
+    with pytest.raises(IndexError):
+        dataset.__getitems__((1, 5))
+
+
+def test_score_range(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetDataset(redis, 'test_redis_sortedset_keys', min_score='(1', max_score=3)
+    assert len(dataset) == 2
+    assert dataset[-1] == ('lorem', 3.0)
+    assert dataset.__getitems__((1, 0)) == [('lorem', 3.0), ('asd', 2.0)]
+    with pytest.raises(IndexError):
+        dataset.__getitems__((0, 2))
+
+def test_refresh_between_build_and_decode(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetDataset(redis, 'test_redis_sortedset_keys', min_score='(1', max_score=3)
+    assert len(dataset) == 2
+    pipeline = redis.pipeline()
+    plan = dataset._build(pipeline, (1, 0))
+    results = pipeline.exec()
+    redis.zadd('test_redis_sortedset_keys', {'first': 0})
+    dataset.refresh()
+    assert len(dataset) == 2
+    assert dataset._decode((1, 0), plan, results) == [('lorem', 3.0), ('asd', 2.0)]
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+import upstash_redis
+from torch.utils.data import DataLoader
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.rpush('test_retry', 'test', 'asd', 'lorem', 'ipsum')
+    yield
+    redis.delete('test_retry')
+
+
+def test_retry_dataset(redis: upstash_redis.Redis):
+    metrics = upstash_dataset.Metrics()
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_retry', metrics=metrics, retry=upstash_dataset.RetryPolicy(base_delay=0))
+    fetch_chunk = dataset._fetch_chunk
+    def flaky_fetch_chunk(idx):
+        if len(idx) > 2:
+            raise ConnectionError("Connection reset")
+        return fetch_chunk(idx)
+    dataset._fetch_chunk = flaky_fetch_chunk
+    assert dataset.__getitems__((3, 0, 1, 2)) == ['ipsum', 'test', 'asd', 'lorem']
+    assert dataset[1] == 'asd'
+    counters = metrics.snapshot()['counters']
+    assert counters['retries'] == 1
+    assert counters['splits'] == 1
+
+def test_fork_workers(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_retry', retry=upstash_dataset.RetryPolicy(deadline=3.0))
+    assert dataset.__getitems__((0, 1)) == ['test', 'asd']
+    loader = DataLoader(dataset, batch_sampler=[[2], [3]], num_workers=2, multiprocessing_context='fork', collate_fn=lambda x: x)
+    assert list(loader) == [['lorem'], ['ipsum']]
+
+def test_deadline():
+    retry = upstash_dataset.RetryPolicy(deadline=0.1)
+    with pytest.raises(TimeoutError):
+        retry.fetch(lambda idx: time.sleep(1) or idx, [0, 1])
+    with pytest.raises(ValueError):
+        retry.fetch(lambda idx: int('a'), [0])
+
+def test_hedge():
+    metrics = upstash_dataset.Metrics()
+    retry = upstash_dataset.RetryPolicy(hedge=True, hedge_min_observations=4)
+    for _ in range(4):
+        retry.observe(0.01)
+    calls = []
+    lock = threading.Lock()
+    def fetch(idx):
+        with lock:
+            calls.append(idx)
+            first = len(calls) == 1
+        time.sleep(2 if first else 0)
+        return idx
+    start = time.monotonic()
+    assert retry.fetch(fetch, [1, 2], metrics=metrics) == [1, 2]
+    assert time.monotonic() - start < 1
+    assert len(calls) == 2
+    assert metrics.snapshot()['counters']['hedges'] == 1
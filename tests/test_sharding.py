@@ -0,0 +1,38 @@
+import pytest
+import upstash_redis
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.rpush('test_sharding', *[str(i) for i in range(10)])
+    yield
+    redis.delete("test_sharding")
+
+
+def test_block_shard_sampler():
+    samplers = [upstash_dataset.BlockShardSampler(range(10), block_size=3, shuffle=False, num_replicas=3, rank=rank) for rank in range(3)]
+    assert [list(sampler) for sampler in samplers] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 0, 1]]
+    samplers = [upstash_dataset.BlockShardSampler(range(10), block_size=3, num_replicas=3, rank=rank) for rank in range(3)]
+    for sampler in samplers:
+        sampler.set_epoch(1)
+    assert set(i for sampler in samplers for i in sampler) == set(range(10))
+
+def test_pinned_blocks():
+    for length, num_replicas in ((3072, 2), (10, 3)):
+        samplers = [upstash_dataset.BlockShardSampler(range(length), block_size=1024 if length > 10 else 3, num_replicas=num_replicas, rank=rank, drop_last=True, reassign_blocks=False) for rank in range(num_replicas)]
+        for epoch in range(2):
+            indices = []
+            for sampler in samplers:
+                sampler.set_epoch(epoch)
+                indices.extend(sampler)
+            assert sorted(indices) == list(range(length // num_replicas * num_replicas))
+    assert set(upstash_dataset.BlockShardSampler(range(10), block_size=3, num_replicas=3, rank=1, reassign_blocks=False)) == {4, 5, 6, 7}
+
+def test_range_reads(redis: upstash_redis.Redis):
+    metrics = upstash_dataset.Metrics()
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_sharding', metrics=metrics)
+    sampler = upstash_dataset.BlockShardSampler(dataset, block_size=5, num_replicas=2, rank=1, shuffle_within_blocks=True)
+    batch = list(sampler)
+    assert sorted(dataset.__getitems__(batch)) == sorted(str(i) for i in batch)
+    assert metrics.collect()['total']['counters']['commands'] == 1
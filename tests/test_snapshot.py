@@ -0,0 +1,40 @@
+import pytest
+import torch
+import upstash_redis
+import upstash_vector
+from upstash_vector.types import FetchResult
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis, index: upstash_vector.Index):
+    redis.lpush('test_snapshot', 'lorem', 'asd', 'test')
+    index.upsert([
+        upstash_vector.types.Vector(id="test_vector_1", vector=[1, 0, 0]),
+        upstash_vector.types.Vector(id="test_vector_2", vector=[0, 1, 0]),
+        upstash_vector.types.Vector(id="test_vector_3", vector=[0, 0, 1]),
+    ], namespace="test_snapshot_namespace")
+    yield
+    redis.delete("test_snapshot")
+    index.delete_namespace("test_snapshot_namespace")
+
+
+def test_snapshot(redis: upstash_redis.Redis, tmp_path):
+    dataset = upstash_dataset.RedisListDataset(redis, 'test_snapshot')
+    snapshot = upstash_dataset.export_snapshot(dataset, str(tmp_path), page_size=2)
+    redis.delete("test_snapshot")
+    assert len(snapshot) == 3
+    assert snapshot.__getitems__((0, 2, 1)) == ['test', 'lorem', 'asd']
+    assert len(upstash_dataset.export_snapshot(dataset, str(tmp_path))) == 3
+
+def test_vector_snapshot(index: upstash_vector.Index, tmp_path):
+    dataset = upstash_dataset.VectorIterableDataset(index, namespace="test_snapshot_namespace", include_metadata=False)
+    upstash_dataset.export_snapshot(dataset, str(tmp_path), page_size=2)
+    snapshot = upstash_dataset.SnapshotDataset(str(tmp_path), output='tensor')
+    batch = snapshot.__getitems__((2, 0))
+    assert batch.ids == ["test_vector_3", "test_vector_1"]
+    assert torch.equal(batch.vectors, torch.tensor([[0, 0, 1], [1, 0, 0]], dtype=torch.float32))
+    assert torch.equal(snapshot[1].vectors, torch.tensor([0, 1, 0], dtype=torch.float32))
+    snapshot = upstash_dataset.SnapshotDataset(str(tmp_path), output='tensor', transform=lambda x: {"embedding": x.vectors})
+    assert torch.equal(snapshot[1]["embedding"], torch.tensor([0, 1, 0], dtype=torch.float32))
+    assert upstash_dataset.SnapshotDataset(str(tmp_path))[1] == FetchResult(id="test_vector_2", vector=[0, 1, 0])
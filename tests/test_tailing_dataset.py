@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+import upstash_redis
+import upstash_vector
+from torch.utils.data import DataLoader
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis, index: upstash_vector.Index):
+    redis.rpush('test_tailing_dataset', 'test', 'asd', 'lorem')
+    index.upsert([
+        upstash_vector.types.Vector(id="test_vector_1", vector=[1, 0, 0]),
+        upstash_vector.types.Vector(id="test_vector_2", vector=[0, 1, 0]),
+        upstash_vector.types.Vector(id="test_vector_3", vector=[0, 0, 1]),
+    ], namespace="test_tailing_namespace")
+    yield
+    redis.delete('test_tailing_dataset')
+    index.delete_namespace("test_tailing_namespace")
+
+
+def test_list_tailing_dataset(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListTailingDataset(redis, 'test_tailing_dataset', start=0, page_size=2, poll_interval=0.01, max_idle=0.05)
+    assert list(dataset) == ['test', 'asd', 'lorem']
+    redis.rpush('test_tailing_dataset', 'ipsum', 'dolor')
+    assert list(dataset) == ['ipsum', 'dolor']
+    assert dataset.state_dict() == {'offset': 5}
+
+def test_slow_producer(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListTailingDataset(redis, 'test_tailing_dataset', page_size=20, poll_interval=0.01, max_poll_interval=0.05, max_idle=0.5)
+    def produce():
+        for i in range(40):
+            time.sleep(0.05)
+            redis.rpush('test_tailing_dataset', str(i))
+    producer = threading.Thread(target=produce)
+    producer.start()
+    samples = list(DataLoader(dataset, batch_size=None, num_workers=2))
+    producer.join()
+    assert sorted(samples, key=int) == [str(i) for i in range(40)]
+
+def test_vector_tailing_dataset(index: upstash_vector.Index):
+    dataset = upstash_dataset.VectorTailingDataset(index, namespace="test_tailing_namespace", transform=lambda x: x.id, page_size=2, poll_interval=0.01, max_idle=0.05)
+    assert list(dataset) == ["test_vector_1", "test_vector_2", "test_vector_3"]
+    index.upsert([upstash_vector.types.Vector(id="test_vector_4", vector=[1, 1, 0])], namespace="test_tailing_namespace")
+    assert list(dataset) == ["test_vector_4"]
+
+def test_resume(redis: upstash_redis.Redis, index: upstash_vector.Index):
+    dataset = upstash_dataset.RedisListTailingDataset(redis, 'test_tailing_dataset', start=0, page_size=5, poll_interval=0.01, max_idle=0.05)
+    assert next(iter(dataset)) == 'test'
+    assert dataset.state_dict() == {'offset': 1}
+    resumed = upstash_dataset.RedisListTailingDataset(redis, 'test_tailing_dataset', page_size=5, poll_interval=0.01, max_idle=0.05)
+    resumed.load_state_dict(dataset.state_dict())
+    assert list(resumed) == ['asd', 'lorem']
+    dataset = upstash_dataset.VectorTailingDataset(index, namespace="test_tailing_namespace", transform=lambda x: x.id, page_size=5, poll_interval=0.01, max_idle=0.05)
+    assert next(iter(dataset)) == "test_vector_1"
+    resumed = upstash_dataset.VectorTailingDataset(index, namespace="test_tailing_namespace", transform=lambda x: x.id, page_size=5, poll_interval=0.01, max_idle=0.05)
+    resumed.load_state_dict(dataset.state_dict())
+    assert list(resumed) == ["test_vector_2", "test_vector_3"]
+
+def test_replay(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisListTailingDataset(redis, 'test_tailing_dataset', start=0, poll_interval=0.01, max_idle=0.05, replay_buffer=2, replay_ratio=1.0)
+    samples = list(dataset)
+    assert len(samples) == 5
+    assert samples[0] == 'test' and samples[1] == 'asd' and samples[3] == 'lorem'
@@ -1,4 +1,5 @@
 import pytest
+import torch
 import upstash_vector
 from upstash_vector.types import FetchResult
 
@@ -28,4 +29,20 @@ def test_transform(index: upstash_vector.Index):
     assert dataset[0] == [1, 0, 0]
     assert dataset[1] == [0, 1, 0]
     assert dataset[2] == [0, 0, 1]
-    assert dataset.__getitems__((0, 2, 1)) == [[1, 0, 0], [0, 0, 1], [0, 1, 0]]
\ No newline at end of file
+    assert dataset.__getitems__((0, 2, 1)) == [[1, 0, 0], [0, 0, 1], [0, 1, 0]]
+
+
+def test_tensor_output(index: upstash_vector.Index):
+    dataset = upstash_dataset.VectorDataset(index, namespace="test_dataset_namespace", id_mapping=lambda x: f'test_vector_{x+1}', output='tensor')
+    batch = upstash_dataset.batch_collate(dataset.__getitems__((0, 2, 1)))
+    assert batch.ids == ["test_vector_1", "test_vector_3", "test_vector_2"]
+    assert batch.vectors.dtype == torch.float32
+    assert batch.vectors.tolist() == [[1, 0, 0], [0, 0, 1], [0, 1, 0]]
+    sample = dataset[1]
+    assert sample.ids == "test_vector_2"
+    assert sample.vectors.tolist() == [0, 1, 0]
+    assert upstash_dataset.batch_collate([dataset[0], sample]).vectors.tolist() == [[1, 0, 0], [0, 1, 0]]
+    dataset = upstash_dataset.VectorDataset(index, namespace="test_dataset_namespace", id_mapping=lambda x: f'test_vector_{x+1}', output='tensor',
+                                            transform=lambda x: {"id": x.ids, "embedding": x.vectors})
+    assert dataset[2]["id"] == "test_vector_3"
+    assert dataset[2]["embedding"].tolist() == [0, 0, 1]
@@ -0,0 +1,37 @@
+import pytest
+import upstash_vector
+from upstash_vector.types import FetchResult
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(index: upstash_vector.Index):
+    index.upsert([
+        upstash_vector.types.Vector(id="test_vector_1", vector=[1, 0, 0]),
+        upstash_vector.types.Vector(id="test_vector_2", vector=[0, 1, 0]),
+        upstash_vector.types.Vector(id="test_vector_3", vector=[0, 0, 1]),
+    ], namespace="test_iterable_namespace")
+    yield
+    index.delete_namespace("test_iterable_namespace")
+
+
+def test_vector_iterable_dataset(index: upstash_vector.Index):
+    dataset = upstash_dataset.VectorIterableDataset(index, namespace="test_iterable_namespace", include_metadata=False, page_size=2)
+    assert list(dataset) == [FetchResult(id="test_vector_1", vector=[1, 0, 0]), FetchResult(id="test_vector_2", vector=[0, 1, 0]), FetchResult(id="test_vector_3", vector=[0, 0, 1])]
+    assert dataset.state_dict() == {"cursor": "", "page": 0}
+
+def test_shuffle(index: upstash_vector.Index):
+    dataset = upstash_dataset.VectorIterableDataset(index, namespace="test_iterable_namespace", transform=lambda x: x.id, page_size=2, shuffle_buffer=2)
+    assert sorted(dataset) == ["test_vector_1", "test_vector_2", "test_vector_3"]
+
+def test_resume_shuffle(index: upstash_vector.Index):
+    index.upsert([upstash_vector.types.Vector(id=str(i), vector=[i, 1, 0]) for i in range(6)], namespace="test_iterable_resume")
+    try:
+        dataset = upstash_dataset.VectorIterableDataset(index, namespace="test_iterable_resume", transform=lambda x: x.id, page_size=2, shuffle_buffer=3)
+        iterator = iter(dataset)
+        consumed = [next(iterator), next(iterator)]
+        resumed = upstash_dataset.VectorIterableDataset(index, namespace="test_iterable_resume", transform=lambda x: x.id, page_size=2, shuffle_buffer=3)
+        resumed.load_state_dict(dataset.state_dict())
+        assert set(consumed) | set(resumed) == {str(i) for i in range(6)}
+    finally:
+        index.delete_namespace("test_iterable_resume")
@@ -0,0 +1,49 @@
+import pickle
+
+import pytest
+import upstash_redis
+
+import upstash_dataset
+
+@pytest.fixture(autouse=True)
+def setup_index(redis: upstash_redis.Redis):
+    redis.zadd('test_window_dataset', {'test': 1, 'asd': 2, 'lorem': 3})
+    yield
+    redis.delete('test_window_dataset')
+
+
+def test_window_dataset(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetWindowDataset(redis, 'test_window_dataset', window=1.5, page_size=1)
+    assert len(dataset) == 2
+    assert dataset.__getitems__((0, 1)) == [('asd', 2.0), ('lorem', 3.0)]
+    redis.zadd('test_window_dataset', {'ipsum': 3, 'dolor': 4})
+    dataset.set_epoch(1)
+    assert dataset.window() == (2.5, 4.0)
+    assert dataset.__getitems__((0, 1, 2)) == [('lorem', 3.0), ('ipsum', 3.0), ('dolor', 4.0)]
+
+def test_advance(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetWindowDataset(redis, 'test_window_dataset', transform=lambda x: x[0])
+    assert dataset.advance(2) == 2
+    assert dataset.advance() == 1
+    assert dataset[-1] == 'lorem'
+    with pytest.raises(ValueError):
+        dataset.advance(1)
+
+def test_ties(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetWindowDataset(redis, 'test_window_dataset', page_size=2)
+    assert len(dataset) == 3
+    redis.zadd('test_window_dataset', {f'tie{i}': 3 for i in range(5)})
+    assert dataset.advance() == 5
+    assert sorted(member for member, _ in dataset.__getitems__(range(2, 8))) == ['lorem', 'tie0', 'tie1', 'tie2', 'tie3', 'tie4']
+
+def test_pickle(redis: upstash_redis.Redis):
+    dataset = upstash_dataset.RedisSortedSetWindowDataset(redis, 'test_window_dataset', window=1.5, page_size=1)
+    assert len(dataset) == 2
+    assert dataset.__getstate__()['_members'] is None
+    copy = pickle.loads(pickle.dumps(dataset))
+    assert copy.__getitems__((0, 1)) == [('asd', 2.0), ('lorem', 3.0)]
+    redis.zadd('test_window_dataset', {'ipsum': 4})
+    assert copy.advance() == 1
+    assert copy.window() == (2.5, 4.0)
+    empty = pickle.loads(pickle.dumps(upstash_dataset.RedisSortedSetWindowDataset(redis, 'test_window_empty', window=10)))
+    assert len(empty) == 0
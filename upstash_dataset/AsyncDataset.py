@@ -0,0 +1,198 @@
+import asyncio
+import functools
+import inspect
+import time
+from collections import deque
+from typing import AsyncIterator, Iterable, List, Sequence
+
+from upstash_dataset.RedisDataset import RedisListDataset, RedisSortedSetDataset, RedisStringDataset, RedisJsonArrayDataset, RedisJsonObjectDataset
+from upstash_dataset.VectorDataset import VectorDataset
+
+
+class AsyncDataset:
+    """
+    Base class for the asyncio datasets
+
+    Async datasets take the asyncio clients (upstash_redis.asyncio.Redis and upstash_vector.AsyncIndex) and are accessed with alen, aget_item, aget_items and aiter_batches instead of len and indexing.
+    With a chunker, the chunks of a batch are fetched concurrently on the event loop.
+    """
+    def __getstate__(self):
+        return self.__dict__.copy()
+
+    async def _alength(self) -> int:
+        raise NotImplementedError
+
+    async def alen(self) -> int:
+        cached = self._length_cache
+        if cached is not None and (self._length_ttl is None or time.monotonic() - cached[1] < self._length_ttl):
+            return cached[0]
+        length = await self._alength()
+        self._length_cache = (length, time.monotonic())
+        return length
+
+    async def _afetch_chunk(self, idx: Sequence[int]) -> List:
+        raise NotImplementedError
+
+    async def _afetch_items(self, idx: Sequence[int]) -> List:
+        fetch = self._afetch_chunk
+        if self._retry is not None:
+            fetch = functools.partial(self._retry.afetch, fetch, metrics=self._metrics)
+        if self._chunker is None:
+            return await fetch(idx)
+        return await self._chunker.afetch(fetch, idx)
+
+    async def aget_item(self, idx: int):
+        sample = (await self._afetch_items([idx]))[0]
+        if self._metrics is None:
+            return self._transform_item(sample)
+        start = time.perf_counter()
+        item = self._transform_item(sample)
+        self._metrics.record_transform(type(self).__name__, start, time.perf_counter(), 1)
+        return item
+
+    async def aget_items(self, idx: Sequence[int]):
+        samples = await self._afetch_items(idx)
+        if self._metrics is None:
+            return self._transform_items(samples)
+        start = time.perf_counter()
+        batch = self._transform_items(samples)
+        self._metrics.record_transform(type(self).__name__, start, time.perf_counter(), len(samples))
+        return batch
+
+    async def aiter_batches(self, batches: Iterable[Sequence[int]], concurrency: int = 8) -> AsyncIterator[List]:
+        """
+        Fetches batches concurrently and yields them in the given order
+
+        :param batches: Iterable returning the indices of each batch, such as a BatchSampler
+        :param concurrency: Maximum number of batches fetched at the same time
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        in_flight = deque()
+        try:
+            for batch in batches:
+                in_flight.append(asyncio.ensure_future(self.aget_items(list(batch))))
+                if len(in_flight) >= concurrency:
+                    yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def __len__(self):
+        raise TypeError(f"{type(self).__name__} is asynchronous, use alen() instead")
+
+    def __getitem__(self, idx):
+        raise TypeError(f"{type(self).__name__} is asynchronous, use aget_item() instead")
+
+    def __getitems__(self, idx):
+        raise TypeError(f"{type(self).__name__} is asynchronous, use aget_items() instead")
+
+
+class _AsyncRedisDataset(AsyncDataset):
+    async def _afetch_chunk(self, idx):
+        metrics = self._metrics
+        if metrics is None:
+            pipeline = self._redis.pipeline()
+            plan = self._build(pipeline, idx)
+            return self._decode(idx, plan, await pipeline.exec())
+        start = time.perf_counter()
+        pipeline = self._redis.pipeline()
+        plan = self._build(pipeline, idx)
+        built = time.perf_counter()
+        results = await pipeline.exec()
+        executed = time.perf_counter()
+        samples = self._decode(idx, plan, results)
+        metrics.record_request(type(self).__name__, start, built, executed, time.perf_counter(), len(idx), len(results), results)
+        return samples
+
+
+async def _call_length_function(length_function) -> int:
+    length = length_function()
+    if inspect.isawaitable(length):
+        length = await length
+    return length
+
+
+class AsyncRedisListDataset(_AsyncRedisDataset, RedisListDataset):
+    """
+    Asyncio dataset class for Upstash Redis List
+
+    Takes the same parameters as RedisListDataset with an upstash_redis.asyncio.Redis client.
+    """
+    async def _alength(self):
+        return await self._redis.llen(self._key)
+
+
+class AsyncRedisSortedSetDataset(_AsyncRedisDataset, RedisSortedSetDataset):
+    """
+    Asyncio dataset class for Upstash Redis Sorted Set
+
+    Takes the same parameters as RedisSortedSetDataset with an upstash_redis.asyncio.Redis client.
+    """
+    async def _alength(self):
+        if self._score_range is None:
+            return await self._redis.zcard(self._key)
+        pipeline = self._redis.pipeline()
+        self._count_range(pipeline)
+        return self._apply_range(await pipeline.exec())
+
+    async def _afetch_items(self, idx):
+        if self._score_range is not None:
+            await self.alen()
+        return await super()._afetch_items(idx)
+
+
+class AsyncRedisStringDataset(_AsyncRedisDataset, RedisStringDataset):
+    """
+    Asyncio dataset class for Upstash Redis String
+
+    Takes the same parameters as RedisStringDataset with an upstash_redis.asyncio.Redis client. The length function may be a coroutine function.
+    """
+    async def _alength(self):
+        return await _call_length_function(self._length_function)
+
+
+class AsyncRedisJsonArrayDataset(_AsyncRedisDataset, RedisJsonArrayDataset):
+    """
+    Asyncio dataset class for Upstash Redis JSON Array
+
+    Takes the same parameters as RedisJsonArrayDataset with an upstash_redis.asyncio.Redis client.
+    """
+    async def _alength(self):
+        l = await self._redis.json.arrlen(self._key, self._array_path)
+        if type(l) == int:
+            return l
+        return l[0]
+
+
+class AsyncRedisJsonObjectDataset(_AsyncRedisDataset, RedisJsonObjectDataset):
+    """
+    Asyncio dataset class for Upstash Redis JSON Object
+
+    Takes the same parameters as RedisJsonObjectDataset with an upstash_redis.asyncio.Redis client. The length function may be a coroutine function.
+    """
+    async def _alength(self):
+        return await _call_length_function(self._length_function)
+
+
+class AsyncVectorDataset(AsyncDataset, VectorDataset):
+    """
+    Asyncio dataset class for Upstash Vector Index
+
+    Takes the same parameters as VectorDataset with an upstash_vector.AsyncIndex.
+    """
+    async def _alength(self):
+        info = await self._index.info()
+        return info.namespaces[self._namespace].vector_count
+
+    async def _afetch_chunk(self, idx):
+        start = time.perf_counter()
+        vectors = await self._index.fetch(ids=[self._id_mapping(i) for i in idx], namespace=self._namespace, **self._options)
+        if self._metrics is not None:
+            end = time.perf_counter()
+            self._metrics.record_request(type(self).__name__, start, start, end, end, len(idx), 1, vectors)
+        if None in vectors:
+            raise IndexError("Index out of range")
+        return vectors
@@ -0,0 +1,160 @@
+import functools
+import time
+from typing import Callable, List, Optional, Tuple
+
+from torch.utils.data import Dataset
+
+from upstash_dataset.Chunking import AdaptiveChunker
+from upstash_dataset.Metrics import Metrics
+from upstash_dataset.Retry import RetryPolicy
+
+
+def identity(sample):
+    """
+    Default transform of the dataset classes, returning the sample unchanged
+
+    A module-level function, unlike a lambda, can be pickled to workers started with spawn or forkserver.
+    """
+    return sample
+
+
+class UpstashDataset(Dataset):
+    """
+    Base class for Upstash datasets
+
+    Subclasses implement _fetch_item and _fetch_items to retrieve raw samples from Upstash, while this class applies the transform on top of them in _transform_item and _transform_items.
+    Wrappers such as CachedDataset use the raw fetch methods to work with samples before they are transformed.
+
+    The length returned by _length is cached, either until refresh is called or a new epoch is set (length_ttl None), for length_ttl seconds, or not at all (length_ttl 0).
+    The cached length is pickled along with the dataset, so DataLoader workers do not query it again.
+
+    Batches are fetched with _fetch_chunk, either at once or split into concurrent chunks by an AdaptiveChunker. If a RetryPolicy is set, every chunk and single sample is fetched through it.
+    If a Metrics object is set, requests and transforms are recorded in it, otherwise nothing is measured.
+    """
+    _transform: Callable
+    _length_ttl: Optional[float] = None
+    _length_cache: Optional[Tuple[int, float]] = None
+    _epoch: Optional[int] = None
+    _chunker: Optional[AdaptiveChunker] = None
+    _metrics: Optional[Metrics] = None
+    _retry: Optional[RetryPolicy] = None
+
+    def __getstate__(self):
+        if self._length_cache is None and self._length_ttl != 0:
+            self._cached_length()
+        return self.__dict__.copy()
+
+    def _identity(self) -> Optional[str]:
+        """
+        :return: String identifying the data this dataset reads, or None if it cannot be determined
+        """
+        return None
+
+    def _length(self) -> int:
+        """
+        :return: Number of samples, queried from Upstash
+        """
+        raise NotImplementedError
+
+    def _cached_length(self) -> int:
+        cached = self._length_cache
+        if cached is not None and (self._length_ttl is None or time.monotonic() - cached[1] < self._length_ttl):
+            return cached[0]
+        length = self._length()
+        self._length_cache = (length, time.monotonic())
+        return length
+
+    def refresh(self):
+        """
+        Drops the cached length, so that it is queried again on the next call to len
+        """
+        self._length_cache = None
+
+    def set_epoch(self, epoch: int):
+        """
+        Refreshes the cached length when a new epoch starts, call it at the start of every epoch to take a length snapshot per epoch
+
+        :param epoch: Epoch number
+        """
+        if epoch != self._epoch:
+            self._epoch = epoch
+            self.refresh()
+
+    def __len__(self):
+        return self._cached_length()
+
+    def _timed_fetch(self, fetch: Callable, samples: int):
+        """
+        Runs a fetch made of a single command, recording it if metrics are enabled
+
+        :param fetch: Function sending the command and returning its result
+        :param samples: Number of samples requested
+        """
+        if self._metrics is None:
+            return fetch()
+        start = time.perf_counter()
+        result = fetch()
+        end = time.perf_counter()
+        self._metrics.record_request(type(self).__name__, start, start, end, end, samples, 1, result)
+        return result
+
+    def _fetch_item(self, idx):
+        """
+        :param idx: Index of the sample
+        :return: Raw sample before transform
+        """
+        return self._fetch_items([idx])[0]
+
+    def _fetch_chunk(self, idx) -> List:
+        """
+        :param idx: Indices of the samples, fetched with a single request
+        :return: Raw samples before transform, in the order of idx
+        """
+        return [self._fetch_item(i) for i in idx]
+
+    def _fetch_items(self, idx) -> List:
+        """
+        :param idx: Indices of the samples
+        :return: Raw samples before transform, in the order of idx
+        """
+        fetch = self._fetch_chunk
+        if self._retry is not None:
+            fetch = functools.partial(self._retry.fetch, fetch, metrics=self._metrics)
+        if self._chunker is None:
+            return fetch(idx)
+        return self._chunker.fetch(fetch, idx)
+
+    def _transform_item(self, sample):
+        """
+        :param sample: Raw sample returned by _fetch_item
+        :return: Sample returned by __getitem__
+        """
+        return self._transform(sample)
+
+    def _transform_items(self, samples: List):
+        """
+        :param samples: Raw samples returned by _fetch_items
+        :return: Batch returned by __getitems__
+        """
+        return [self._transform(i) for i in samples]
+
+    def __getitem__(self, idx):
+        if self._retry is None:
+            sample = self._fetch_item(idx)
+        else:
+            sample = self._retry.call(self._fetch_item, idx, metrics=self._metrics)
+        if self._metrics is None:
+            return self._transform_item(sample)
+        start = time.perf_counter()
+        item = self._transform_item(sample)
+        self._metrics.record_transform(type(self).__name__, start, time.perf_counter(), 1)
+        return item
+
+    def __getitems__(self, idx):
+        samples = self._fetch_items(idx)
+        if self._metrics is None:
+            return self._transform_items(samples)
+        start = time.perf_counter()
+        batch = self._transform_items(samples)
+        self._metrics.record_transform(type(self).__name__, start, time.perf_counter(), len(samples))
+        return batch
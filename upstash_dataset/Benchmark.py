@@ -0,0 +1,205 @@
+import argparse
+import functools
+import itertools
+import json
+import random
+import string
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from torch.utils.data import DataLoader, Sampler, RandomSampler, SequentialSampler
+
+from upstash_dataset.LocalUpstash import LocalUpstashServer
+from upstash_dataset.RedisDataset import RedisListDataset, RedisSortedSetDataset, RedisStringDataset, RedisJsonArrayDataset, RedisJsonObjectDataset
+from upstash_dataset.VectorDataset import VectorDataset
+
+DATASETS = ('list', 'zset', 'string', 'json-array', 'json-object', 'vector')
+SAMPLERS = ('sequential', 'random', 'chunked')
+
+
+class ChunkShuffledSampler(Sampler):
+    """
+    Sampler shuffling the order of contiguous chunks of indices, keeping the indices of each chunk in order
+    """
+    def __init__(self, length: int, chunk_size: int, seed: int = 0):
+        self._length = length
+        self._chunk_size = chunk_size
+        self._seed = seed
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self) -> Iterator[int]:
+        starts = list(range(0, self._length, self._chunk_size))
+        random.Random(self._seed).shuffle(starts)
+        for start in starts:
+            yield from range(start, min(start + self._chunk_size, self._length))
+
+
+def _identity_collate(batch):
+    return batch
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _random_text(rng: random.Random, size: int) -> str:
+    return ''.join(rng.choices(string.ascii_letters, k=size))
+
+
+def seed_dataset(server: LocalUpstashServer, kind: str, num_samples: int, sample_size: int, seed: int = 0):
+    """
+    Stores a synthetic dataset in a local server
+
+    :param server: Local server to store the samples in
+    :param kind: One of list, zset, string, json-array, json-object and vector
+    :param num_samples: Number of samples
+    :param sample_size: Approximate size of each sample in bytes, vectors get sample_size // 8 dimensions
+    :param seed: Seed of the random samples
+    """
+    rng = random.Random(seed)
+    prefix = f'bench:{kind}:{sample_size}'
+    if kind == 'list':
+        server.load_list(prefix, [_random_text(rng, sample_size) for _ in range(num_samples)])
+    elif kind == 'zset':
+        server.load_sorted_set(prefix, {f'{i}:{_random_text(rng, sample_size)}': i for i in range(num_samples)})
+    elif kind == 'string':
+        server.load_strings({f'{prefix}:{i}': _random_text(rng, sample_size) for i in range(num_samples)})
+    elif kind == 'json-array':
+        server.load_json({prefix: {'array': [_random_text(rng, sample_size) for _ in range(num_samples)]}})
+    elif kind == 'json-object':
+        server.load_json({f'{prefix}:{i}': {'text': _random_text(rng, sample_size)} for i in range(num_samples)})
+    elif kind == 'vector':
+        dimension = max(sample_size // 8, 1)
+        server.load_vectors(prefix, [{'id': str(i), 'vector': [rng.random() for _ in range(dimension)]} for i in range(num_samples)])
+    else:
+        raise ValueError(f"Unknown dataset {kind}")
+
+
+def create_dataset(server: LocalUpstashServer, kind: str, num_samples: int, sample_size: int):
+    """
+    :return: Dataset reading the samples stored by seed_dataset
+    """
+    prefix = f'bench:{kind}:{sample_size}'
+    if kind == 'list':
+        return RedisListDataset(server.redis(), prefix)
+    if kind == 'zset':
+        return RedisSortedSetDataset(server.redis(), prefix)
+    if kind == 'string':
+        return RedisStringDataset(server.redis(), (prefix + ':{}').format, functools.partial(int, num_samples))
+    if kind == 'json-array':
+        return RedisJsonArrayDataset(server.redis(), prefix, '$.array')
+    if kind == 'json-object':
+        return RedisJsonObjectDataset(server.redis(), (prefix + ':{}').format, functools.partial(int, num_samples), '$.text')
+    if kind == 'vector':
+        return VectorDataset(server.index(), namespace=prefix, include_metadata=False)
+    raise ValueError(f"Unknown dataset {kind}")
+
+
+def create_sampler(kind: str, length: int, batch_size: int, seed: int = 0) -> Sampler:
+    if kind == 'sequential':
+        return SequentialSampler(range(length))
+    if kind == 'random':
+        return RandomSampler(range(length))
+    if kind == 'chunked':
+        return ChunkShuffledSampler(length, batch_size * 4, seed)
+    raise ValueError(f"Unknown sampler {kind}")
+
+
+def run_benchmark(server: LocalUpstashServer, dataset, sampler: Sampler, batch_size: int, num_workers: int,
+                  max_batches: Optional[int] = None) -> Dict[str, float]:
+    """
+    Loads batches of a dataset with a DataLoader and measures the throughput
+
+    The latency of a batch is the time the training loop waits for it, so with workers it includes the time the batch was fetched ahead.
+
+    :param server: Local server the dataset reads from
+    :param dataset: Dataset to load
+    :param sampler: Sampler of the indices
+    :param batch_size: Number of samples in each batch
+    :param num_workers: Number of DataLoader workers
+    :param max_batches: Maximum number of batches loaded, None to load the whole dataset
+    :return: Samples per second, p50 and p99 batch latency in seconds, HTTP requests and bytes transferred per batch
+    """
+    loader = DataLoader(dataset, batch_size=batch_size, sampler=sampler, num_workers=num_workers, collate_fn=_identity_collate)
+    server.reset_stats()
+    latencies = []
+    samples = 0
+    start = time.perf_counter()
+    previous = start
+    for batch in itertools.islice(loader, max_batches):
+        now = time.perf_counter()
+        latencies.append(now - previous)
+        previous = now
+        samples += len(batch)
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    batches = max(len(latencies), 1)
+    return {
+        'samples_per_second': samples / elapsed if elapsed > 0 else 0.0,
+        'p50_latency': _percentile(latencies, 0.5),
+        'p99_latency': _percentile(latencies, 0.99),
+        'requests_per_batch': stats['requests'] / batches,
+        'bytes_per_batch': (stats['bytes_received'] + stats['bytes_sent']) / batches,
+        'batches': len(latencies),
+    }
+
+
+def run_suite(datasets: Sequence[str] = DATASETS, batch_sizes: Sequence[int] = (32, 256), workers: Sequence[int] = (0, 2),
+              samplers: Sequence[str] = SAMPLERS, sample_sizes: Sequence[int] = (64, 4096), num_samples: int = 4096,
+              max_batches: Optional[int] = 50, latency: float = 0.0, bandwidth: Optional[float] = None, seed: int = 0) -> List[dict]:
+    """
+    Runs every combination of the given settings against a local server
+
+    :return: One result per combination, with the settings and the measurements of run_benchmark
+    """
+    results = []
+    with LocalUpstashServer(latency=latency, bandwidth=bandwidth) as server:
+        for kind, sample_size in itertools.product(datasets, sample_sizes):
+            seed_dataset(server, kind, num_samples, sample_size, seed)
+            for sampler, batch_size, num_workers in itertools.product(samplers, batch_sizes, workers):
+                dataset = create_dataset(server, kind, num_samples, sample_size)
+                result = {'dataset': kind, 'sample_size': sample_size, 'sampler': sampler, 'batch_size': batch_size, 'workers': num_workers}
+                result.update(run_benchmark(server, dataset, create_sampler(sampler, num_samples, batch_size, seed), batch_size, num_workers, max_batches))
+                results.append(result)
+    return results
+
+
+def format_results(results: List[dict]) -> str:
+    header = f"{'dataset':<12}{'size':>7}{'sampler':>12}{'batch':>7}{'workers':>8}{'samples/s':>12}{'p50 ms':>9}{'p99 ms':>9}{'req/batch':>11}{'KiB/batch':>11}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(f"{r['dataset']:<12}{r['sample_size']:>7}{r['sampler']:>12}{r['batch_size']:>7}{r['workers']:>8}"
+                     f"{r['samples_per_second']:>12.0f}{r['p50_latency'] * 1000:>9.2f}{r['p99_latency'] * 1000:>9.2f}"
+                     f"{r['requests_per_batch']:>11.2f}{r['bytes_per_batch'] / 1024:>11.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark upstash_dataset classes against a local Upstash REST stand-in")
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=list(DATASETS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[32, 256])
+    parser.add_argument('--workers', nargs='+', type=int, default=[0, 2])
+    parser.add_argument('--samplers', nargs='+', choices=SAMPLERS, default=list(SAMPLERS))
+    parser.add_argument('--sample-sizes', nargs='+', type=int, default=[64, 4096], help="Approximate size of each sample in bytes")
+    parser.add_argument('--num-samples', type=int, default=4096)
+    parser.add_argument('--max-batches', type=int, default=50, help="Batches loaded per run, 0 to load the whole dataset")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument('--bandwidth', type=float, default=None, help="Bytes per second of the emulated link")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Path to write the results to as JSON")
+    args = parser.parse_args(argv)
+    results = run_suite(args.datasets, args.batch_sizes, args.workers, args.samplers, args.sample_sizes, args.num_samples,
+                        args.max_batches or None, args.latency, args.bandwidth, args.seed)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
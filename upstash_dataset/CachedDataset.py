@@ -0,0 +1,252 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from upstash_dataset.BaseDataset import UpstashDataset
+from upstash_dataset.Metrics import Metrics
+
+_RECORD_HEADER = struct.Struct('<qI')
+_SCAN_INTERVAL = 10.0
+
+
+class _FileLock:
+    """
+    Exclusive advisory lock on a file, shared between DataLoader worker processes
+
+    Locking is skipped on platforms without fcntl.
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class _Shard:
+    """
+    Read-only memory map over an append-only shard file
+
+    Each record in the file is an (index, length) header followed by the pickled raw sample.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.inode = None
+        self.size = 0
+        self.offsets = {}
+        self._mmap = None
+        self._scanned = 0
+        self.last_touch = 0.0
+
+    def refresh(self) -> bool:
+        """
+        Maps the records appended since the last refresh
+
+        :return: False if the shard file does not exist anymore
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return False
+        if stat.st_ino != self.inode or stat.st_size < self.size:
+            self.close()
+            self.inode = stat.st_ino
+        if stat.st_size == self.size:
+            return True
+        if self._mmap is not None:
+            self._mmap.close()
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), stat.st_size, access=mmap.ACCESS_READ)
+        self.size = stat.st_size
+        offset = self._scanned
+        while offset + _RECORD_HEADER.size <= self.size:
+            idx, length = _RECORD_HEADER.unpack_from(self._mmap, offset)
+            end = offset + _RECORD_HEADER.size + length
+            if end > self.size:
+                break
+            self.offsets[idx] = (offset + _RECORD_HEADER.size, length)
+            offset = end
+        self._scanned = offset
+        return True
+
+    def read(self, idx):
+        start, length = self.offsets[idx]
+        return pickle.loads(self._mmap[start:start + length])
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = None
+        self.inode = None
+        self.size = 0
+        self.offsets = {}
+        self._scanned = 0
+
+
+class CachedDataset(UpstashDataset):
+    """
+    Local disk cache for Upstash datasets
+
+    This class wraps any Upstash dataset and stores the raw samples it fetches in memory-mapped shard files on local disk, so that later epochs are read at disk speed and only missing samples are fetched from Upstash.
+    Samples are cached before the transform of the wrapped dataset is applied. The cache directory can be shared by DataLoader workers and by later runs, and it is kept below a byte budget by evicting the least recently used shards.
+    """
+    def __init__(self, dataset: UpstashDataset, cache_dir: str, max_bytes: int = 1 << 30, name: Optional[str] = None, shard_size: int = 4096, metrics: Optional[Metrics] = None):
+        """
+        :param dataset: Upstash dataset to cache
+        :param cache_dir: Directory to store the cache shards in
+        :param max_bytes: Maximum total size of the cache shards in bytes
+        :param name: Name identifying the cached data, derived from the dataset's database URL and key or namespace if not given
+        :param shard_size: Number of consecutive indices stored in the same shard file
+        :param metrics: Records cache hits and misses, None to disable instrumentation
+        """
+        if name is None:
+            name = dataset._identity()
+            if name is None:
+                raise ValueError("Cache name can not be derived from the dataset, please provide a name")
+        self._dataset = dataset
+        self._directory = os.path.join(cache_dir, hashlib.sha1(name.encode()).hexdigest()[:16])
+        self._max_bytes = max_bytes
+        self._name = name
+        self._shard_size = shard_size
+        self._shards = {}
+        self._length_ttl = 0
+        self._metrics = metrics
+        self._cache_bytes = None
+        self._last_scan = 0.0
+        os.makedirs(self._directory, exist_ok=True)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_shards'] = {}
+        state['_cache_bytes'] = None
+        return state
+
+    def _identity(self):
+        return self._name
+
+    def _length(self):
+        return len(self._dataset)
+
+    def _transform_item(self, sample):
+        return self._dataset._transform_item(sample)
+
+    def _transform_items(self, samples):
+        return self._dataset._transform_items(samples)
+
+    def refresh(self):
+        self._dataset.refresh()
+
+    def set_epoch(self, epoch: int):
+        self._dataset.set_epoch(epoch)
+
+    def _shard(self, shard_id: int) -> _Shard:
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            shard = _Shard(os.path.join(self._directory, f'shard_{shard_id}.bin'))
+            self._shards[shard_id] = shard
+        return shard
+
+    def _fetch_items(self, idx):
+        fetched = {}
+        missing = []
+        touched = set()
+        for i in idx:
+            if i in fetched:
+                continue
+            if i < 0:
+                missing.append(i)
+                continue
+            shard = self._shard(i // self._shard_size)
+            if i not in shard.offsets and not (shard.refresh() and i in shard.offsets):
+                missing.append(i)
+                continue
+            fetched[i] = shard.read(i)
+            touched.add(shard)
+        self._touch(touched)
+        if self._metrics is not None:
+            self._metrics.count('cache_hits', len(fetched))
+            self._metrics.count('cache_misses', len(set(missing)))
+        if missing:
+            missing = list(dict.fromkeys(missing))
+            for i, sample in zip(missing, self._dataset._fetch_items(missing)):
+                fetched[i] = sample
+            self._store({i: fetched[i] for i in missing if i >= 0 and fetched[i] is not None})
+        return [fetched[i] for i in idx]
+
+    def _touch(self, shards):
+        now = time.time()
+        for shard in shards:
+            if now - shard.last_touch > 1:
+                shard.last_touch = now
+                try:
+                    os.utime(shard.path)
+                except FileNotFoundError:
+                    pass
+
+    def _store(self, samples: dict):
+        records = {}
+        for i, sample in samples.items():
+            payload = pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL)
+            records.setdefault(i // self._shard_size, []).append(_RECORD_HEADER.pack(i, len(payload)) + payload)
+        if not records:
+            return
+        written = 0
+        for shard_id, shard_records in records.items():
+            path = self._shard(shard_id).path
+            data = b''.join(shard_records)
+            with _FileLock(path + '.lock'):
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+            written += len(data)
+        if self._cache_bytes is not None:
+            self._cache_bytes += written
+        self._evict()
+
+    def _evict(self):
+        # The running total misses the writes of other processes, so the directory is also rescanned when the total is stale
+        if self._cache_bytes is not None and self._cache_bytes <= self._max_bytes and time.monotonic() - self._last_scan < _SCAN_INTERVAL:
+            return
+        self._last_scan = time.monotonic()
+        shards = []
+        total = 0
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                shards.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        self._cache_bytes = total
+        if total <= self._max_bytes:
+            return
+        with _FileLock(os.path.join(self._directory, '.evict.lock')):
+            for _, size, path in sorted(shards):
+                if total <= self._max_bytes:
+                    break
+                with _FileLock(path + '.lock'):
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        continue
+                total -= size
+        self._cache_bytes = total
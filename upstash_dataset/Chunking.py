@@ -0,0 +1,180 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+
+def estimate_size(value, depth: int = 0) -> int:
+    """
+    Estimates the number of bytes a decoded value took in the response body
+
+    :param value: Decoded value, such as a string, a JSON document or a FetchResult
+    :param depth: Current recursion depth, nested values deeper than 8 levels are counted as 8 bytes
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value) + 2
+    if value is None or isinstance(value, (int, float, bool)) or depth > 8:
+        return 8
+    if isinstance(value, dict):
+        return sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in value.items()) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v, depth + 1) for v in value) + 2
+    if hasattr(value, '__dict__'):
+        return estimate_size(vars(value), depth + 1)
+    return 8
+
+
+class AdaptiveChunker:
+    """
+    Splits batches into chunks sized for a target payload and fetches them concurrently
+
+    The number of samples per chunk is learned from the response sizes and latencies observed so far, so that every request carries about target_bytes and, if set, takes about target_latency seconds.
+    Chunks are dispatched concurrently from a thread pool and share the connection pool of the Upstash client. The asyncio datasets fetch them concurrently with afetch instead.
+    A chunker can be passed to any dataset class with the chunker parameter, and can be shared by several datasets.
+    """
+    def __init__(self, target_bytes: int = 512 * 1024, target_latency: Optional[float] = None, max_concurrency: int = 4,
+                 initial_chunk_size: int = 64, min_chunk_size: int = 1, max_chunk_size: int = 8192,
+                 smoothing: float = 0.2, size_samples: int = 8):
+        """
+        :param target_bytes: Target size of each response body in bytes
+        :param target_latency: Target latency of each request in seconds, None to size chunks by bytes only
+        :param max_concurrency: Maximum number of chunks fetched at the same time
+        :param initial_chunk_size: Number of samples per chunk before any response has been observed
+        :param min_chunk_size: Minimum number of samples per chunk
+        :param max_chunk_size: Maximum number of samples per chunk
+        :param smoothing: Weight of the latest observation in the moving averages
+        :param size_samples: Number of samples of each response used to estimate the response size
+        """
+        self._target_bytes = target_bytes
+        self._target_latency = target_latency
+        self._max_concurrency = max_concurrency
+        self._initial_chunk_size = initial_chunk_size
+        self._min_chunk_size = min_chunk_size
+        self._max_chunk_size = max_chunk_size
+        self._smoothing = smoothing
+        self._size_samples = size_samples
+        self._bytes_per_sample = None
+        self._seconds_per_sample = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['_executor'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def chunk_size(self) -> int:
+        """
+        :return: Number of samples per chunk for the next batch
+        """
+        if self._bytes_per_sample is None:
+            size = self._initial_chunk_size
+        else:
+            size = self._target_bytes / max(self._bytes_per_sample, 1)
+            if self._target_latency is not None and self._seconds_per_sample:
+                size = min(size, self._target_latency / self._seconds_per_sample)
+        return int(min(max(size, self._min_chunk_size), self._max_chunk_size))
+
+    def observe(self, samples: int, nbytes: int, seconds: float):
+        """
+        Updates the moving averages with a completed request
+
+        :param samples: Number of samples in the request
+        :param nbytes: Size of the response in bytes
+        :param seconds: Latency of the request
+        """
+        if samples == 0:
+            return
+        with self._lock:
+            if self._bytes_per_sample is None:
+                self._bytes_per_sample = nbytes / samples
+                self._seconds_per_sample = seconds / samples
+            else:
+                self._bytes_per_sample += self._smoothing * (nbytes / samples - self._bytes_per_sample)
+                self._seconds_per_sample += self._smoothing * (seconds / samples - self._seconds_per_sample)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._pid != os.getpid():
+            # A forked worker inherits the pool of its parent without its threads, and possibly a held lock
+            self._lock = threading.Lock()
+            self._executor = None
+            self._pid = os.getpid()
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='upstash-chunk')
+        return self._executor
+
+    def _fetch_chunk(self, fetch: Callable[[List], List], chunk: List) -> List:
+        start = time.perf_counter()
+        samples = fetch(chunk)
+        seconds = time.perf_counter() - start
+        measured = samples[:self._size_samples]
+        if measured:
+            nbytes = sum(estimate_size(s) for s in measured) * len(samples) / len(measured)
+            self.observe(len(chunk), int(nbytes), seconds)
+        return samples
+
+    def _split(self, idx: Sequence) -> List[List]:
+        # Indices are deduplicated and sorted, so that chunks of range-based datasets stay contiguous
+        unique = sorted(set(idx))
+        size = self.chunk_size()
+        return [unique[i:i + size] for i in range(0, len(unique), size)]
+
+    @staticmethod
+    def _merge(idx: Sequence, chunks: List[List], results: List[List]) -> List:
+        fetched = {}
+        for chunk, samples in zip(chunks, results):
+            fetched.update(zip(chunk, samples))
+        return [fetched[i] for i in idx]
+
+    def fetch(self, fetch: Callable[[List], List], idx: Sequence) -> List:
+        """
+        Fetches a batch in chunks
+
+        Indices are deduplicated and sorted before splitting, so that chunks of range-based datasets stay contiguous.
+
+        :param fetch: Function fetching the raw samples of a list of indices
+        :param idx: Indices of the samples
+        :return: Raw samples in the order of idx
+        """
+        chunks = self._split(idx)
+        if len(chunks) <= 1 or self._max_concurrency <= 1:
+            results = [self._fetch_chunk(fetch, chunk) for chunk in chunks]
+        else:
+            results = list(self._get_executor().map(lambda chunk: self._fetch_chunk(fetch, chunk), chunks))
+        return self._merge(idx, chunks, results)
+
+    async def afetch(self, fetch: Callable, idx: Sequence) -> List:
+        """
+        Asyncio version of fetch, with at most max_concurrency chunks awaited at the same time
+
+        :param fetch: Coroutine function fetching the raw samples of a list of indices
+        :param idx: Indices of the samples
+        :return: Raw samples in the order of idx
+        """
+        chunks = self._split(idx)
+        semaphore = asyncio.Semaphore(max(self._max_concurrency, 1))
+
+        async def fetch_chunk(chunk):
+            async with semaphore:
+                start = time.perf_counter()
+                samples = await fetch(chunk)
+                seconds = time.perf_counter() - start
+            measured = samples[:self._size_samples]
+            if measured:
+                nbytes = sum(estimate_size(s) for s in measured) * len(samples) / len(measured)
+                self.observe(len(chunk), int(nbytes), seconds)
+            return samples
+
+        results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+        return self._merge(idx, chunks, results)
@@ -0,0 +1,123 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import upstash_redis
+import upstash_redis.asyncio
+import upstash_vector
+
+_clients: Dict[tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def _reset_clients():
+    # Clients inherited from the parent process share its connections, so a forked process creates its own
+    global _lock
+    _clients.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_clients)
+
+
+def _token(headers: dict) -> str:
+    return headers['Authorization'][len('Bearer '):]
+
+
+def client_spec(client) -> Optional[Tuple[type, dict]]:
+    """
+    :param client: Upstash Redis or Upstash Vector client, sync or asyncio
+    :return: Class and keyword arguments creating a client with the same configuration, None if the client is not recognized
+    """
+    try:
+        if isinstance(client, (upstash_redis.Redis, upstash_redis.asyncio.Redis)):
+            return type(client), {
+                'url': client._url,
+                'token': _token(client._headers),
+                'rest_encoding': 'base64' if 'Upstash-Encoding' in client._headers else None,
+                'rest_retries': client._http._retries,
+                'rest_retry_interval': client._http._retry_interval,
+                'allow_telemetry': client._allow_telemetry,
+                'read_your_writes': client._read_your_writes,
+            }
+        if isinstance(client, (upstash_vector.Index, upstash_vector.AsyncIndex)):
+            return type(client), {
+                'url': client._url,
+                'token': _token(client._headers),
+                'retries': client._retries,
+                'retry_interval': client._retry_interval,
+                'allow_telemetry': 'Upstash-Telemetry-Sdk' in client._headers,
+            }
+    except (AttributeError, KeyError):
+        # Clients of other SDK versions may not expose their configuration
+        return None
+    return None
+
+
+class LazyClient:
+    """
+    Picklable handle to an Upstash client
+
+    The process the handle is created in uses the client the handle was created with. Only the configuration of the client is pickled, and other processes create a client from it on first use. Within such a process, handles with the same configuration share a client, and with it a pool of HTTP connections.
+    Forked processes, such as DataLoader workers, also create their own clients instead of sharing the connections of their parent.
+    Attributes and methods of the client are available on the handle.
+    """
+    def __init__(self, client):
+        """
+        :param client: Upstash Redis or Upstash Vector client, sync or asyncio
+        """
+        spec = client_spec(client)
+        if spec is None:
+            raise TypeError(f"Can not read the configuration of {type(client).__name__}")
+        self._cls, self._kwargs = spec
+        self._key = (self._cls, tuple(sorted(self._kwargs.items())))
+        self._client = client
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    def client(self):
+        """
+        :return: Client of the current process
+        """
+        if self._client is not None and self._pid == os.getpid():
+            return self._client
+        client = _clients.get(self._key)
+        if client is None:
+            with _lock:
+                client = _clients.get(self._key)
+                if client is None:
+                    client = _clients[self._key] = self._cls(**self._kwargs)
+        return client
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.client(), name)
+
+    def __repr__(self):
+        return f"LazyClient({self._cls.__name__}, url={self._kwargs['url']!r})"
+
+
+def client_url(client) -> Optional[str]:
+    """
+    :param client: Upstash client or LazyClient
+    :return: REST URL of the client, None if it can not be read
+    """
+    if isinstance(client, LazyClient):
+        return client._kwargs['url']
+    return getattr(client, '_url', None)
+
+
+def lazy_client(client):
+    """
+    :param client: Upstash client
+    :return: LazyClient of the client, or the client itself if it is already a LazyClient or its configuration can not be read
+    """
+    if isinstance(client, LazyClient) or client_spec(client) is None:
+        return client
+    return LazyClient(client)
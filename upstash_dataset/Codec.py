@@ -0,0 +1,211 @@
+import base64
+import ctypes
+from typing import Callable, Iterable, List, Optional, Sequence, Union
+
+import torch
+import upstash_redis
+
+
+def _compression(name: Optional[str]):
+    """
+    :param name: 'zstd', 'lz4' or None
+    :return: Compress and decompress functions
+    """
+    if name is None:
+        return None, None
+    if name == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the zstandard package, install it with pip install zstandard")
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    if name == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError("lz4 compression requires the lz4 package, install it with pip install lz4")
+        return lz4.frame.compress, lz4.frame.decompress
+    raise ValueError(f"Unknown compression: {name}")
+
+
+class Codec:
+    """
+    Base class for sample encodings
+
+    Redis values are stored as base64 text, since the REST API transfers values as UTF-8 strings, optionally compressed with zstd or lz4 before the base64 step.
+    Subclasses turn a sample into bytes in _pack and back in _unpack, and may decode a whole batch at once in decode_batch.
+    """
+    def __init__(self, compression: Optional[str] = None):
+        """
+        :param compression: 'zstd' or 'lz4' to compress the encoded samples, None to store them uncompressed
+        """
+        self._compression = compression
+        self._compress, self._decompress = _compression(compression)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_compress'] = state['_decompress'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compress, self._decompress = _compression(self._compression)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(compression={self._compression!r})"
+
+    def _pack(self, value) -> bytes:
+        raise NotImplementedError
+
+    def _unpack(self, data: bytes):
+        raise NotImplementedError
+
+    def _to_bytes(self, text: str) -> bytes:
+        if text is None:
+            raise ValueError("Can not decode a missing sample")
+        data = base64.b64decode(text)
+        if self._decompress is not None:
+            data = self._decompress(data)
+        return data
+
+    def encode(self, value) -> str:
+        """
+        :param value: Sample to encode
+        :return: Text to store in Redis
+        """
+        data = self._pack(value)
+        if self._compress is not None:
+            data = self._compress(data)
+        return base64.b64encode(data).decode()
+
+    def decode(self, text: str):
+        """
+        :param text: Value read from Redis
+        :return: Decoded sample
+        """
+        return self._unpack(self._to_bytes(text))
+
+    def decode_batch(self, texts: Sequence[str]):
+        """
+        :param texts: Values read from Redis
+        :return: Decoded batch
+        """
+        return [self.decode(t) for t in texts]
+
+
+class ArrayCodec(Codec):
+    """
+    Encoding of numeric arrays as raw little-endian bytes
+
+    Batches are decoded into a single tensor of shape [batch, *shape] with one copy, samples of different sizes are decoded into a list of tensors.
+    """
+    def __init__(self, dtype: torch.dtype = torch.float32, shape: Optional[Sequence[int]] = None, compression: Optional[str] = None):
+        """
+        :param dtype: Data type of the array elements
+        :param shape: Shape of each sample, None to decode samples as flat arrays
+        :param compression: 'zstd' or 'lz4' to compress the encoded samples, None to store them uncompressed
+        """
+        super().__init__(compression)
+        self._dtype = dtype
+        self._shape = None if shape is None else tuple(shape)
+
+    def __repr__(self):
+        return f"ArrayCodec(dtype={self._dtype}, shape={self._shape}, compression={self._compression!r})"
+
+    def _pack(self, value) -> bytes:
+        tensor = torch.as_tensor(value, dtype=self._dtype).contiguous().cpu()
+        return ctypes.string_at(tensor.data_ptr(), tensor.numel() * tensor.element_size())
+
+    def _unpack(self, data: bytes) -> torch.Tensor:
+        tensor = torch.frombuffer(bytearray(data), dtype=self._dtype)
+        return tensor if self._shape is None else tensor.view(self._shape)
+
+    def decode_batch(self, texts: Sequence[str]) -> Union[torch.Tensor, List[torch.Tensor]]:
+        if self._decompress is None and None not in texts and texts:
+            # Values without padding are whole base64 blocks, so their concatenation decodes to the concatenated arrays
+            if len(set(len(t) for t in texts)) == 1 and not texts[0].endswith('='):
+                data = base64.b64decode(''.join(texts))
+                return torch.frombuffer(bytearray(data), dtype=self._dtype).view(len(texts), *(self._shape or (-1,)))
+        arrays = [self._to_bytes(t) for t in texts]
+        if len(set(len(a) for a in arrays)) == 1:
+            return torch.frombuffer(bytearray(b''.join(arrays)), dtype=self._dtype).view(len(arrays), *(self._shape or (-1,)))
+        return [self._unpack(a) for a in arrays]
+
+
+class MsgpackCodec(Codec):
+    """
+    Encoding of arbitrary samples with MessagePack
+
+    Requires the msgpack package.
+    """
+    def __init__(self, compression: Optional[str] = None):
+        """
+        :param compression: 'zstd' or 'lz4' to compress the encoded samples, None to store them uncompressed
+        """
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("MsgpackCodec requires the msgpack package, install it with pip install msgpack")
+        super().__init__(compression)
+
+    def _pack(self, value) -> bytes:
+        import msgpack
+        return msgpack.packb(value)
+
+    def _unpack(self, data: bytes):
+        import msgpack
+        return msgpack.unpackb(data)
+
+
+def write_list(redis: upstash_redis.Redis, key: str, values: Iterable, codec: Codec, chunk_size: int = 1000) -> int:
+    """
+    Encodes samples and appends them to a Redis list, to be read by RedisListDataset with the same codec
+
+    :param redis: Upstash Redis client
+    :param key: Redis key to the list
+    :param values: Samples to encode
+    :param codec: Codec encoding the samples
+    :param chunk_size: Number of samples sent with each RPUSH
+    :return: Number of samples written
+    """
+    written = 0
+    chunk = []
+    for value in values:
+        chunk.append(codec.encode(value))
+        if len(chunk) >= chunk_size:
+            redis.rpush(key, *chunk)
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        redis.rpush(key, *chunk)
+        written += len(chunk)
+    return written
+
+
+def write_strings(redis: upstash_redis.Redis, key_mapping: Callable, values: Iterable, codec: Codec, chunk_size: int = 1000, start: int = 0) -> int:
+    """
+    Encodes samples and stores each in its own key, to be read by RedisStringDataset with the same codec
+
+    :param redis: Upstash Redis client
+    :param key_mapping: Function to map the index to the Redis key
+    :param values: Samples to encode
+    :param codec: Codec encoding the samples
+    :param chunk_size: Number of samples sent with each pipeline
+    :param start: Index of the first sample
+    :return: Number of samples written
+    """
+    written = 0
+    pipeline = redis.pipeline()
+    pending = 0
+    for i, value in enumerate(values, start):
+        pipeline.set(key_mapping(i), codec.encode(value))
+        pending += 1
+        if pending >= chunk_size:
+            pipeline.exec()
+            written += pending
+            pipeline = redis.pipeline()
+            pending = 0
+    if pending:
+        pipeline.exec()
+        written += pending
+    return written
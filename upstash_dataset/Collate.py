@@ -0,0 +1,32 @@
+import torch
+from torch.utils.data._utils.collate import default_collate
+
+from upstash_dataset.VectorDataset import VectorBatch
+
+
+def batch_collate(batch):
+    """
+    Collate function for datasets that return whole batches from __getitems__
+
+    Batches that are already decoded, such as a VectorBatch, the tensor decoded by an ArrayCodec or the output of a batch_transform applied to them, are returned without copying. Lists of decoded batches are concatenated, and lists of VectorBatch rows, which DataLoader builds for datasets without __getitems__ such as ConcatDataset, are stacked. Anything else is collated with PyTorch's default_collate.
+
+    :param batch: Output of the dataset for one batch
+    """
+    if not isinstance(batch, list):
+        return batch
+    if len(batch) > 0 and isinstance(batch[0], VectorBatch):
+        if not isinstance(batch[0].ids, list):
+            # Samples returned by __getitem__ are single rows
+            return VectorBatch(
+                ids=[b.ids for b in batch],
+                vectors=torch.stack([b.vectors for b in batch]),
+                metadata=[b.metadata for b in batch],
+                data=[b.data for b in batch],
+            )
+        return VectorBatch(
+            ids=[i for b in batch for i in b.ids],
+            vectors=torch.cat([b.vectors for b in batch]),
+            metadata=[m for b in batch for m in b.metadata],
+            data=[d for b in batch for d in b.data],
+        )
+    return default_collate(batch)
@@ -0,0 +1,151 @@
+import heapq
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from typing import Iterator, List, Optional
+
+import upstash_redis
+
+_HEADER = struct.Struct('<4sIQ')
+_MAGIC = b'UDKI'
+_VERSION = 1
+_RUN_RECORD = struct.Struct('<I')
+
+
+def _write_run(keys: List[bytes], directory: str) -> str:
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.run')
+    with os.fdopen(fd, 'wb') as f:
+        for key in keys:
+            f.write(_RUN_RECORD.pack(len(key)))
+            f.write(key)
+    return path
+
+
+def _read_run(path: str) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_RUN_RECORD.size)
+            if not header:
+                return
+            yield f.read(_RUN_RECORD.unpack(header)[0])
+
+
+class KeyIndex:
+    """
+    Sorted table of Redis keys, stored in a memory-mapped file
+
+    This class can be used as the key_mapping of RedisStringDataset and RedisJsonObjectDataset, with its length method as the length_function.
+    Keys are stored in a single string arena with an array of offsets, so that tens of millions of keys take little memory and the table is shared by DataLoader workers through the page cache.
+    A KeyIndex is built with a SCAN over the database and persisted to a file, which later runs load instantly.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: Path of a key index file created by KeyIndex.build
+        """
+        self._path = path
+        self._mmap = None
+        self._offsets = None
+        self._count = 0
+        self._arena_start = 0
+        self._open()
+
+    def _open(self):
+        with open(self._path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{self._path} is not a key index file")
+        self._count = count
+        self._arena_start = _HEADER.size + 8 * (count + 1)
+        self._offsets = memoryview(self._mmap)[_HEADER.size:self._arena_start].cast('Q')
+
+    def __getstate__(self):
+        return {'_path': self._path}
+
+    def __setstate__(self, state):
+        self._path = state['_path']
+        self._open()
+
+    @classmethod
+    def build(cls, redis: upstash_redis.Redis, path: str, match: Optional[str] = None, count: int = 1000,
+              scan_type: Optional[str] = None, chunk_size: int = 1_000_000) -> 'KeyIndex':
+        """
+        Scans the database and writes the sorted keys to a key index file
+
+        Keys are sorted in chunks that are merged on disk, so memory use is bounded by chunk_size regardless of the number of keys.
+
+        :param redis: Upstash Redis client
+        :param path: Path of the key index file to write
+        :param match: Glob-style pattern of the keys to include
+        :param count: Number of keys requested with each SCAN call
+        :param scan_type: Type of the keys to include, such as 'string' or 'ReJSON-RL'
+        :param chunk_size: Maximum number of keys sorted in memory at once
+        :return: Key index loaded from the written file
+        """
+        options = {'match': match, 'count': count}
+        if scan_type is not None:
+            options['type'] = scan_type
+        directory = os.path.dirname(os.path.abspath(path))
+        runs = []
+        keys = []
+        try:
+            cursor = 0
+            while True:
+                cursor, page = redis.scan(cursor, **options)
+                keys.extend(key.encode() for key in page)
+                if len(keys) >= chunk_size:
+                    runs.append(_write_run(sorted(set(keys)), directory))
+                    keys = []
+                if int(cursor) == 0:
+                    break
+            keys = sorted(set(keys))
+            cls._write(path, heapq.merge(keys, *[_read_run(run) for run in runs]))
+        finally:
+            for run in runs:
+                os.unlink(run)
+        return cls(path)
+
+    @staticmethod
+    def _write(path: str, keys: Iterator[bytes]):
+        offsets = array('Q', [0])
+        fd, arena_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.arena')
+        try:
+            with os.fdopen(fd, 'wb') as arena:
+                previous = None
+                for key in keys:
+                    if key == previous:
+                        continue
+                    arena.write(key)
+                    offsets.append(offsets[-1] + len(key))
+                    previous = key
+            with open(path + '.tmp', 'wb') as f, open(arena_path, 'rb') as arena:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, len(offsets) - 1))
+                offsets.tofile(f)
+                shutil.copyfileobj(arena, f)
+            os.replace(path + '.tmp', path)
+        finally:
+            os.unlink(arena_path)
+
+    def length(self) -> int:
+        """
+        :return: Number of keys in the index
+        """
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __call__(self, idx: int) -> str:
+        """
+        :param idx: Index of the sample
+        :return: Redis key of the sample
+        """
+        if idx < 0:
+            idx += self._count
+        if idx < 0 or idx >= self._count:
+            raise IndexError("Index out of range")
+        start = self._arena_start + self._offsets[idx]
+        return self._mmap[start:self._arena_start + self._offsets[idx + 1]].decode()
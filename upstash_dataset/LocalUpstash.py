@@ -0,0 +1,434 @@
+import base64
+import fnmatch
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import upstash_redis
+import upstash_vector
+
+
+class LocalUpstashError(Exception):
+    pass
+
+
+def _parse_path(path: str) -> List[tuple]:
+    if not path.startswith('$'):
+        path = '$' + ('' if path in ('', '.') or path.startswith('.') or path.startswith('[') else '.') + path.lstrip('$')
+        if path == '$.':
+            path = '$'
+    tokens = []
+    i = 1
+    while i < len(path):
+        if path[i] == '.':
+            j = i + 1
+            while j < len(path) and path[j] not in '.[':
+                j += 1
+            name = path[i + 1:j]
+            if not name:
+                raise LocalUpstashError(f"ERR unsupported JSONPath {path}")
+            tokens.append(('wildcard',) if name == '*' else ('keys', [name]))
+            i = j
+        elif path[i] == '[':
+            j = path.index(']', i)
+            inner = path[i + 1:j].strip()
+            if inner == '*':
+                tokens.append(('wildcard',))
+            elif inner[:1] in ('"', "'"):
+                tokens.append(('keys', [name.strip().strip('"\'') for name in inner.split(',')]))
+            elif ':' in inner:
+                start, stop = inner.split(':')[:2]
+                tokens.append(('slice', int(start) if start.strip() else None, int(stop) if stop.strip() else None))
+            else:
+                tokens.append(('indices', [int(n) for n in inner.split(',')]))
+            i = j + 1
+        else:
+            raise LocalUpstashError(f"ERR unsupported JSONPath {path}")
+    return tokens
+
+
+def _evaluate_path(document: Any, path: str) -> List[Any]:
+    matches = [document]
+    for token in _parse_path(path):
+        found = []
+        for match in matches:
+            if token[0] == 'keys' and isinstance(match, dict):
+                found.extend(match[name] for name in token[1] if name in match)
+            elif token[0] == 'wildcard' and isinstance(match, dict):
+                found.extend(match.values())
+            elif token[0] == 'wildcard' and isinstance(match, list):
+                found.extend(match)
+            elif token[0] == 'indices' and isinstance(match, list):
+                found.extend(match[i] for i in token[1] if -len(match) <= i < len(match))
+            elif token[0] == 'slice' and isinstance(match, list):
+                found.extend(match[token[1]:token[2]])
+        matches = found
+    return matches
+
+
+def _parse_score(bound: str):
+    bound = str(bound)
+    exclusive = bound.startswith('(')
+    if exclusive:
+        bound = bound[1:]
+    return float(bound.replace('+inf', 'inf')), exclusive
+
+
+def _in_score_range(score: float, low, high) -> bool:
+    if score < low[0] or (low[1] and score == low[0]):
+        return False
+    return not (score > high[0] or (high[1] and score == high[0]))
+
+
+def _format_score(score: float) -> str:
+    return str(int(score)) if score.is_integer() else repr(score)
+
+
+def _range_bounds(length: int, start: int, stop: int):
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop = length + stop
+    return start, min(stop, length - 1)
+
+
+class LocalUpstashServer:
+    """
+    In-process HTTP server emulating the Upstash Redis and Upstash Vector REST APIs
+
+    This class serves the subset of the REST APIs used by the dataset classes from memory, so that datasets can be benchmarked and tested without Upstash credentials.
+    Latency and bandwidth can be injected to model a remote database, and the number of requests and bytes transferred are counted.
+    """
+    def __init__(self, latency: float = 0.0, bandwidth: Optional[float] = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        :param latency: Seconds added to every request
+        :param bandwidth: Bytes per second of the emulated link, None for no limit
+        :param host: Host to listen on
+        :param port: Port to listen on, 0 to pick a free port
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._data: Dict[str, tuple] = {}
+        self._namespaces: Dict[str, Dict[str, dict]] = {}
+        self._requests = 0
+        self._commands = 0
+        self._bytes_received = 0
+        self._bytes_sent = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'LocalUpstashServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def redis(self, **kwargs) -> upstash_redis.Redis:
+        """
+        :return: Upstash Redis client connected to this server
+        """
+        return upstash_redis.Redis(self.url, 'local', allow_telemetry=False, **kwargs)
+
+    def async_redis(self, **kwargs):
+        import upstash_redis.asyncio
+        return upstash_redis.asyncio.Redis(self.url, 'local', allow_telemetry=False, **kwargs)
+
+    def index(self, **kwargs) -> upstash_vector.Index:
+        """
+        :return: Upstash Vector Index connected to this server
+        """
+        return upstash_vector.Index(self.url, 'local', allow_telemetry=False, **kwargs)
+
+    def async_index(self, **kwargs) -> upstash_vector.AsyncIndex:
+        return upstash_vector.AsyncIndex(self.url, 'local', allow_telemetry=False, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Number of HTTP requests, Redis commands and bytes transferred since the last reset
+        """
+        with self._stats_lock:
+            return {'requests': self._requests, 'commands': self._commands, 'bytes_received': self._bytes_received, 'bytes_sent': self._bytes_sent}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._requests = self._commands = self._bytes_received = self._bytes_sent = 0
+
+    def _record(self, commands: int, received: int, sent: int):
+        with self._stats_lock:
+            self._requests += 1
+            self._commands += commands
+            self._bytes_received += received
+            self._bytes_sent += sent
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                start = time.perf_counter()
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                payload = json.loads(body) if body else None
+                encoding = self.headers.get('Upstash-Encoding')
+                status, response, commands = server._dispatch(self.path, payload, encoding)
+                data = json.dumps(response).encode()
+                server._record(commands, len(body), len(data))
+                delay = server.latency
+                if server.bandwidth:
+                    delay += (len(body) + len(data)) / server.bandwidth
+                delay -= time.perf_counter() - start
+                if delay > 0:
+                    time.sleep(delay)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+        return Handler
+
+    def _dispatch(self, path: str, payload, encoding):
+        path = path.rstrip('/') or '/'
+        if path == '/':
+            result = self._run_command(payload, encoding)
+            return (400 if 'error' in result else 200), result, 1
+        if path in ('/pipeline', '/multi-exec'):
+            return 200, [self._run_command(command, encoding) for command in payload], len(payload)
+        operation, _, namespace = path.lstrip('/').partition('/')
+        try:
+            with self._lock:
+                return 200, {'result': self._vector_operation(operation, namespace, payload)}, 1
+        except LocalUpstashError as e:
+            return 400, {'error': str(e)}, 1
+
+    def _run_command(self, command: List, encoding) -> dict:
+        try:
+            with self._lock:
+                result = self._execute(command[0].upper(), command[1:])
+        except LocalUpstashError as e:
+            return {'error': str(e)}
+        except (ValueError, IndexError, TypeError, KeyError) as e:
+            return {'error': f'ERR {e}'}
+        if encoding == 'base64':
+            result = self._encode(result)
+        return {'result': result}
+
+    def _encode(self, value):
+        if isinstance(value, str):
+            return value if value == 'OK' else base64.b64encode(value.encode()).decode()
+        if isinstance(value, list):
+            return [self._encode(v) for v in value]
+        return value
+
+    def _get(self, key: str, kind: str, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[0] != kind:
+            raise LocalUpstashError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return entry[1]
+
+    def _sorted_members(self, key: str) -> List[tuple]:
+        return sorted(self._get(key, 'zset', {}).items(), key=lambda item: (item[1], item[0]))
+
+    def _execute(self, name: str, args: List):
+        if name == 'PING':
+            return 'PONG'
+        if name in ('FLUSHALL', 'FLUSHDB'):
+            self._data.clear()
+            return 'OK'
+        if name == 'DEL':
+            return sum(self._data.pop(key, None) is not None for key in args)
+        if name == 'EXISTS':
+            return sum(key in self._data for key in args)
+        if name == 'SET':
+            self._data[args[0]] = ('string', str(args[1]))
+            return 'OK'
+        if name == 'GET':
+            return self._get(args[0], 'string')
+        if name == 'MGET':
+            return [self._data[k][1] if k in self._data and self._data[k][0] == 'string' else None for k in args]
+        if name in ('LPUSH', 'RPUSH'):
+            values = self._get(args[0], 'list')
+            if values is None:
+                values = []
+                self._data[args[0]] = ('list', values)
+            for value in args[1:]:
+                if name == 'LPUSH':
+                    values.insert(0, str(value))
+                else:
+                    values.append(str(value))
+            return len(values)
+        if name == 'LLEN':
+            return len(self._get(args[0], 'list', []))
+        if name == 'LINDEX':
+            values = self._get(args[0], 'list', [])
+            i = int(args[1])
+            return values[i] if -len(values) <= i < len(values) else None
+        if name == 'LRANGE':
+            values = self._get(args[0], 'list', [])
+            start, stop = _range_bounds(len(values), int(args[1]), int(args[2]))
+            return values[start:stop + 1]
+        if name == 'ZADD':
+            members = self._get(args[0], 'zset')
+            if members is None:
+                members = {}
+                self._data[args[0]] = ('zset', members)
+            pairs = [a for a in args[1:] if str(a).upper() not in ('NX', 'XX', 'GT', 'LT', 'CH', 'INCR')]
+            added = 0
+            for score, member in zip(pairs[0::2], pairs[1::2]):
+                added += str(member) not in members
+                members[str(member)] = float(score)
+            return added
+        if name == 'ZCARD':
+            return len(self._get(args[0], 'zset', {}))
+        if name == 'ZCOUNT':
+            low, high = _parse_score(args[1]), _parse_score(args[2])
+            return sum(_in_score_range(score, low, high) for score in self._get(args[0], 'zset', {}).values())
+        if name in ('ZRANGE', 'ZRANGEBYSCORE'):
+            options = [str(a).upper() for a in args[3:]]
+            members = self._sorted_members(args[0])
+            if name == 'ZRANGEBYSCORE' or 'BYSCORE' in options:
+                low, high = _parse_score(args[1]), _parse_score(args[2])
+                selected = [m for m in members if _in_score_range(m[1], low, high)]
+            else:
+                if 'REV' in options:
+                    members = members[::-1]
+                start, stop = _range_bounds(len(members), int(args[1]), int(args[2]))
+                selected = members[start:stop + 1]
+            if 'LIMIT' in options:
+                offset = int(args[3 + options.index('LIMIT') + 1])
+                count = int(args[3 + options.index('LIMIT') + 2])
+                selected = selected[offset:] if count < 0 else selected[offset:offset + count]
+            if 'WITHSCORES' in options:
+                return [v for member, score in selected for v in (member, _format_score(score))]
+            return [member for member, _ in selected]
+        if name == 'SCAN':
+            cursor = int(args[0])
+            options = {str(args[i]).upper(): args[i + 1] for i in range(1, len(args) - 1, 2)}
+            count = int(options.get('COUNT', 10))
+            keys = sorted(self._data)
+            page = keys[cursor:cursor + count]
+            next_cursor = cursor + count if cursor + count < len(keys) else 0
+            if 'MATCH' in options:
+                page = [k for k in page if fnmatch.fnmatchcase(k, options['MATCH'])]
+            if 'TYPE' in options:
+                page = [k for k in page if self._data[k][0] == options['TYPE']]
+            return [str(next_cursor), page]
+        if name == 'JSON.SET':
+            document = json.loads(args[2])
+            if args[1] in ('$', '.'):
+                self._data[args[0]] = ('ReJSON-RL', document)
+                return 'OK'
+            raise LocalUpstashError('ERR only root paths can be set')
+        if name == 'JSON.GET':
+            document = self._get(args[0], 'ReJSON-RL')
+            if document is None:
+                return None
+            paths = args[1:] or ['$']
+            if len(paths) == 1:
+                return json.dumps(_evaluate_path(document, paths[0]))
+            return json.dumps({path: _evaluate_path(document, path) for path in paths})
+        if name == 'JSON.MGET':
+            path = args[-1]
+            results = []
+            for key in args[:-1]:
+                entry = self._data.get(key)
+                results.append(json.dumps(_evaluate_path(entry[1], path)) if entry and entry[0] == 'ReJSON-RL' else None)
+            return results
+        if name == 'JSON.ARRLEN':
+            document = self._get(args[0], 'ReJSON-RL')
+            if document is None:
+                return None
+            return [len(m) if isinstance(m, list) else None for m in _evaluate_path(document, args[1] if len(args) > 1 else '$')]
+        raise LocalUpstashError(f"ERR unknown command '{name}'")
+
+    def _vector_operation(self, operation: str, namespace: str, payload):
+        vectors = self._namespaces.setdefault(namespace, {})
+        if operation == 'upsert':
+            for vector in payload if isinstance(payload, list) else [payload]:
+                vectors[vector['id']] = {k: v for k, v in vector.items() if v is not None and k != 'sparseVector'}
+            return 'Success'
+        if operation == 'fetch':
+            return [self._vector_result(vectors.get(i), payload) for i in payload.get('ids', [])]
+        if operation == 'range':
+            ids = sorted(vectors)
+            start = int(payload.get('cursor') or 0)
+            page = ids[start:start + int(payload['limit'])]
+            next_cursor = str(start + len(page)) if start + len(page) < len(ids) else ''
+            return {'nextCursor': next_cursor, 'vectors': [self._vector_result(vectors[i], payload) for i in page]}
+        if operation == 'info':
+            dimension = next((len(v['vector']) for ns in self._namespaces.values() for v in ns.values() if 'vector' in v), 0)
+            return {
+                'vectorCount': sum(len(ns) for ns in self._namespaces.values()),
+                'pendingVectorCount': 0,
+                'indexSize': 0,
+                'dimension': dimension,
+                'similarityFunction': 'COSINE',
+                'namespaces': {name: {'vectorCount': len(ns), 'pendingVectorCount': 0} for name, ns in self._namespaces.items()},
+            }
+        if operation == 'list-namespaces':
+            return list(self._namespaces)
+        if operation in ('delete-namespace', 'reset'):
+            self._namespaces.pop(namespace, None)
+            return 'Success'
+        raise LocalUpstashError(f'Unknown operation {operation}')
+
+    @staticmethod
+    def _vector_result(vector: Optional[dict], payload: dict) -> Optional[dict]:
+        if vector is None:
+            return None
+        result = {'id': vector['id']}
+        for field, option in (('vector', 'includeVectors'), ('metadata', 'includeMetadata'), ('data', 'includeData')):
+            if payload.get(option) and field in vector:
+                result[field] = vector[field]
+        return result
+
+    def load_list(self, key: str, values: List[str]):
+        """
+        Stores a list directly, without going through the REST API
+        """
+        with self._lock:
+            self._data[key] = ('list', list(values))
+
+    def load_sorted_set(self, key: str, members: Dict[str, float]):
+        with self._lock:
+            self._data[key] = ('zset', {m: float(s) for m, s in members.items()})
+
+    def load_strings(self, values: Dict[str, str]):
+        with self._lock:
+            self._data.update({k: ('string', v) for k, v in values.items()})
+
+    def load_json(self, values: Dict[str, Any]):
+        with self._lock:
+            self._data.update({k: ('ReJSON-RL', v) for k, v in values.items()})
+
+    def load_vectors(self, namespace: str, vectors: List[dict]):
+        with self._lock:
+            self._namespaces.setdefault(namespace, {}).update({v['id']: v for v in vectors})
@@ -0,0 +1,316 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from multiprocessing import util
+from typing import Dict, List, Optional
+
+from torch.utils.data import get_worker_info
+
+from upstash_dataset.Chunking import estimate_size
+
+
+_ZERO_BUCKET = -1075
+
+
+def _bucket(value: float) -> int:
+    """
+    :return: Exponent of the power-of-two histogram bucket holding value, values up to 2 ** exponent fall into the bucket
+    """
+    if value <= 0:
+        return _ZERO_BUCKET
+    mantissa, exponent = math.frexp(value)
+    return exponent - 1 if mantissa == 0.5 else exponent
+
+
+class Histogram:
+    """
+    Histogram with power-of-two buckets, which can be merged across processes
+    """
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        exponent = _bucket(value)
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def merge(self, other: 'Histogram'):
+        self.count += other.count
+        self.sum += other.sum
+        for exponent, count in other.buckets.items():
+            self.buckets[exponent] = self.buckets.get(exponent, 0) + count
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: Quantile between 0 and 1
+        :return: Upper bound of the bucket holding the quantile, at most twice the exact value
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for exponent in sorted(self.buckets):
+            seen += self.buckets[exponent]
+            if seen >= rank:
+                break
+        return 0.0 if exponent == _ZERO_BUCKET else math.ldexp(1.0, exponent)
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'buckets': {str(e): c for e, c in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Histogram':
+        histogram = cls()
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.buckets = {int(e): c for e, c in data['buckets'].items()}
+        return histogram
+
+
+class Metrics:
+    """
+    Collects timings and counters of the requests made by datasets
+
+    A Metrics object can be passed to any dataset class with the metrics parameter, and can be shared by several datasets.
+    Requests are timed in build, exec and decode phases, and batches in a transform phase. Counters track requests, commands, samples, estimated response bytes, cache hits and misses, and the retries, splits, hedges and missed deadlines of a RetryPolicy.
+
+    Each process records into its own copy, so DataLoader workers do not contend. With a directory, every process writes its metrics there on flush and at exit, and collect merges them in the main process.
+    Files left in the directory by earlier runs are removed when the Metrics object is created.
+    With trace enabled, every phase is also recorded as a trace event, and write_trace writes a file that can be opened in chrome://tracing or Perfetto.
+    """
+    def __init__(self, directory: Optional[str] = None, trace: bool = False, flush_interval: float = 10.0):
+        """
+        :param directory: Directory the metrics of every process are written to, None to keep them in the current process
+        :param trace: Whether to record trace events
+        :param flush_interval: Minimum number of seconds between automatic writes to directory
+        """
+        self._directory = directory
+        self._trace = trace
+        self._flush_interval = flush_interval
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for path in glob.glob(os.path.join(directory, 'metrics_*.json')) + glob.glob(os.path.join(directory, 'trace_*.json')):
+                os.unlink(path)
+        self._pid = None
+        self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._events: List[dict] = []
+        self._last_flush = time.monotonic()
+        if self._directory is not None:
+            util.Finalize(None, self.flush, exitpriority=10)
+
+    def __getstate__(self):
+        return {'_directory': self._directory, '_trace': self._trace, '_flush_interval': self._flush_interval}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+    def _check_process(self):
+        # A forked worker starts with a copy of the parent's metrics, which it must not report again
+        if os.getpid() != self._pid:
+            self._start()
+
+    def count(self, name: str, value: float = 1):
+        """
+        Increments a counter
+
+        :param name: Name of the counter
+        :param value: Amount to add
+        """
+        self._check_process()
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """
+        Adds a value to a histogram
+
+        :param name: Name of the histogram
+        :param value: Observed value
+        """
+        self._check_process()
+        with self._lock:
+            self._add(name, value)
+
+    def _add(self, name: str, value: float):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram()
+        histogram.add(value)
+
+    def _event(self, name: str, category: str, start: float, end: float, args: Optional[dict] = None):
+        self._events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                             'pid': self._pid, 'tid': threading.get_ident(), 'args': args or {}})
+
+    def record_request(self, source: str, start: float, built: float, executed: float, end: float, samples: int, commands: int, response):
+        """
+        Records a request fetching samples
+
+        :param source: Name of the dataset class making the request
+        :param start: perf_counter time the request started to be built
+        :param built: perf_counter time the request was sent
+        :param executed: perf_counter time the response was received
+        :param end: perf_counter time the response was decoded
+        :param samples: Number of samples requested
+        :param commands: Number of commands in the request
+        :param response: Response before decoding, its size is estimated as the bytes received
+        """
+        self._check_process()
+        nbytes = estimate_size(response)
+        with self._lock:
+            self._add('build_seconds', built - start)
+            self._add('exec_seconds', executed - built)
+            self._add('decode_seconds', end - executed)
+            self._add('commands_per_request', commands)
+            self._add('bytes_per_request', nbytes)
+            self._counters['requests'] = self._counters.get('requests', 0) + 1
+            self._counters['commands'] = self._counters.get('commands', 0) + commands
+            self._counters['bytes_received'] = self._counters.get('bytes_received', 0) + nbytes
+            if self._trace:
+                args = {'samples': samples, 'commands': commands, 'bytes': nbytes}
+                self._event('build', source, start, built, args)
+                self._event('exec', source, built, executed, args)
+                self._event('decode', source, executed, end, args)
+        self._maybe_flush()
+
+    def record_transform(self, source: str, start: float, end: float, samples: int):
+        """
+        Records the transform of a batch
+
+        :param source: Name of the dataset class
+        :param start: perf_counter time the transform started
+        :param end: perf_counter time the transform ended
+        :param samples: Number of samples in the batch
+        """
+        self._check_process()
+        with self._lock:
+            self._add('transform_seconds', end - start)
+            self._add('samples_per_batch', samples)
+            self._counters['batches'] = self._counters.get('batches', 0) + 1
+            self._counters['samples'] = self._counters.get('samples', 0) + samples
+            if self._trace:
+                self._event('transform', source, start, end, {'samples': samples})
+        self._maybe_flush()
+
+    def snapshot(self) -> dict:
+        """
+        :return: Counters and histograms recorded by the current process
+        """
+        self._check_process()
+        worker = get_worker_info()
+        with self._lock:
+            return {
+                'worker': 'main' if worker is None else f'worker-{worker.id}',
+                'pid': self._pid,
+                'counters': dict(self._counters),
+                'histograms': {name: h.to_dict() for name, h in self._histograms.items()},
+            }
+
+    def reset(self):
+        """
+        Drops the metrics recorded by the current process
+        """
+        self._check_process()
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._events.clear()
+
+    def _path(self, kind: str, pid: int) -> str:
+        return os.path.join(self._directory, f'{kind}_{pid}.json')
+
+    def _maybe_flush(self):
+        if self._directory is not None and time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the metrics of the current process to the directory
+        """
+        if self._directory is None or os.getpid() != self._pid:
+            return
+        self._last_flush = time.monotonic()
+        snapshot = self.snapshot()
+        with self._lock:
+            events = list(self._events)
+        for kind, data in (('metrics', snapshot), ('trace', events)):
+            if kind == 'trace' and not self._trace:
+                continue
+            path = self._path(kind, self._pid)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(data, f)
+            os.replace(path + '.tmp', path)
+
+    def _snapshots(self) -> List[dict]:
+        snapshots = [self.snapshot()]
+        if self._directory is not None:
+            for path in glob.glob(os.path.join(self._directory, 'metrics_*.json')):
+                if path != self._path('metrics', self._pid):
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+        return snapshots
+
+    def collect(self) -> dict:
+        """
+        Merges the metrics of every process
+
+        :return: Merged counters and histograms under 'total', and the metrics of each process under 'workers'
+        """
+        counters = {}
+        histograms = {}
+        workers = {}
+        for snapshot in self._snapshots():
+            workers[f"{snapshot['worker']}:{snapshot['pid']}"] = snapshot
+            for name, value in snapshot['counters'].items():
+                counters[name] = counters.get(name, 0) + value
+            for name, data in snapshot['histograms'].items():
+                histograms.setdefault(name, Histogram()).merge(Histogram.from_dict(data))
+        hits, misses = counters.get('cache_hits', 0), counters.get('cache_misses', 0)
+        if hits + misses:
+            counters['cache_hit_rate'] = hits / (hits + misses)
+        return {'total': {'counters': counters, 'histograms': {name: h.to_dict() for name, h in histograms.items()}}, 'workers': workers}
+
+    def summary(self) -> str:
+        """
+        :return: Table of the merged counters and histograms
+        """
+        total = self.collect()['total']
+        lines = [f"{name:<24}{value:>16.6g}" for name, value in sorted(total['counters'].items())]
+        lines.append(f"{'histogram':<24}{'count':>10}{'mean':>12}{'p50':>12}{'p99':>12}")
+        for name, data in sorted(total['histograms'].items()):
+            h = Histogram.from_dict(data)
+            lines.append(f"{name:<24}{h.count:>10}{h.sum / max(h.count, 1):>12.4g}{h.percentile(0.5):>12.4g}{h.percentile(0.99):>12.4g}")
+        return '\n'.join(lines)
+
+    def write_trace(self, path: str):
+        """
+        Writes the trace events of every process to a Chrome trace file
+
+        :param path: Path of the trace file
+        """
+        self.flush()
+        with self._lock:
+            events = list(self._events)
+        if self._directory is not None:
+            for trace in glob.glob(os.path.join(self._directory, 'trace_*.json')):
+                if trace != self._path('trace', self._pid):
+                    with open(trace) as f:
+                        events.extend(json.load(f))
+        names = {}
+        for snapshot in self._snapshots():
+            names[snapshot['pid']] = snapshot['worker']
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}} for pid, name in names.items()]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + events}, f)
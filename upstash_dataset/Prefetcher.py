@@ -0,0 +1,141 @@
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Sequence
+
+from torch.utils.data import BatchSampler, Dataset, RandomSampler, SequentialSampler
+from torch.utils.data._utils.collate import default_collate
+
+
+def _collate_and_transform(samples, collate_fn: Optional[Callable], batch_transform: Optional[Callable]):
+    if collate_fn is not None:
+        samples = collate_fn(samples)
+    if batch_transform is not None:
+        samples = batch_transform(samples)
+    return samples
+
+
+def _copy_result(source: Future, target: Future):
+    exception = source.exception()
+    if exception is not None:
+        target.set_exception(exception)
+    else:
+        target.set_result(source.result())
+
+
+def _chain(future: Future, executor: Executor, fn: Callable, *args) -> Future:
+    """
+    Submits fn to executor with the result of future once it is done
+
+    :return: Future of the result of fn, failing with the exception of either stage
+    """
+    chained = Future()
+    chained.set_running_or_notify_cancel()
+
+    def submit(done: Future):
+        if done.cancelled():
+            chained.set_exception(RuntimeError("Batch fetch was cancelled"))
+            return
+        if done.exception() is not None:
+            chained.set_exception(done.exception())
+            return
+        try:
+            executor.submit(fn, done.result(), *args).add_done_callback(lambda f: _copy_result(f, chained))
+        except RuntimeError as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(submit)
+    return chained
+
+
+class PrefetchLoader:
+    """
+    Read-ahead batch loader for Upstash datasets
+
+    This class consumes the index stream of a batch sampler and keeps a bounded number of future batches in flight on a background thread pool, so that the next batches are already fetched from Upstash while the current one is used for training.
+    Batches are returned in the order of the sampler. It works with any dataset, batches are fetched with __getitems__ when the dataset implements it.
+
+    A batch_transform is applied to each collated batch, so that tokenizers and numpy functions run once per batch instead of once per sample.
+    With transform_workers, transforms run on a separate pool overlapped with the fetches of the next batches: the fetch threads then only make requests, and the transform of the Upstash dataset, collate_fn and batch_transform run on the transform pool.
+    With a process pool, the transform of the dataset still runs on the fetch threads, and collate_fn and batch_transform must be picklable.
+    """
+    def __init__(self, dataset: Dataset, batch_size: int = 1, shuffle: bool = False, drop_last: bool = False,
+                 batch_sampler: Optional[Iterable[Sequence[int]]] = None, prefetch_batches: int = 4,
+                 num_threads: Optional[int] = None, collate_fn: Optional[Callable] = default_collate,
+                 batch_transform: Optional[Callable] = None, transform_workers: int = 0, transform_pool: str = 'thread'):
+        """
+        :param dataset: Dataset to load batches from
+        :param batch_size: Number of samples in each batch, ignored if batch_sampler is given
+        :param shuffle: Whether to shuffle the samples, ignored if batch_sampler is given
+        :param drop_last: Whether to drop the last incomplete batch, ignored if batch_sampler is given
+        :param batch_sampler: Iterable returning the indices of each batch
+        :param prefetch_batches: Maximum number of batches fetched ahead of the consumer
+        :param num_threads: Number of threads fetching batches concurrently, defaults to prefetch_batches
+        :param collate_fn: Function to merge the samples of a batch, or None to return the samples as they are fetched
+        :param batch_transform: Function to transform each batch after collate_fn
+        :param transform_workers: Number of workers running transforms, 0 to run them on the fetch threads
+        :param transform_pool: 'thread' or 'process', the kind of pool running transforms
+        """
+        if prefetch_batches < 1:
+            raise ValueError("prefetch_batches must be at least 1")
+        if transform_pool not in ('thread', 'process'):
+            raise ValueError(f"Unknown transform pool: {transform_pool}")
+        if batch_sampler is None:
+            sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+            batch_sampler = BatchSampler(sampler, batch_size, drop_last)
+        self._dataset = dataset
+        self._batch_sampler = batch_sampler
+        self._prefetch_batches = prefetch_batches
+        self._num_threads = num_threads or prefetch_batches
+        self._collate_fn = collate_fn
+        self._batch_transform = batch_transform
+        self._transform_workers = transform_workers
+        self._transform_pool = transform_pool
+
+    def __len__(self):
+        return len(self._batch_sampler)
+
+    def _fetch_samples(self, batch):
+        if hasattr(self._dataset, '__getitems__'):
+            return self._dataset.__getitems__(batch)
+        return [self._dataset[i] for i in batch]
+
+    def _fetch(self, batch):
+        return _collate_and_transform(self._fetch_samples(batch), self._collate_fn, self._batch_transform)
+
+    def _fetch_raw(self, batch):
+        return self._dataset._fetch_items(batch)
+
+    def _transform(self, samples):
+        return _collate_and_transform(self._dataset._transform_items(samples), self._collate_fn, self._batch_transform)
+
+    def __iter__(self):
+        in_flight = deque()
+        executor = ThreadPoolExecutor(max_workers=self._num_threads, thread_name_prefix='upstash-prefetch')
+        transform_executor = None
+        if self._transform_workers > 0:
+            if self._transform_pool == 'process':
+                transform_executor = ProcessPoolExecutor(max_workers=self._transform_workers)
+            else:
+                transform_executor = ThreadPoolExecutor(max_workers=self._transform_workers, thread_name_prefix='upstash-transform')
+        split = transform_executor is not None and self._transform_pool == 'thread' and hasattr(self._dataset, '_fetch_items') and hasattr(self._dataset, '_transform_items')
+        try:
+            for batch in self._batch_sampler:
+                if transform_executor is None:
+                    fetch = executor.submit(self._fetch, list(batch))
+                    in_flight.append((fetch, fetch))
+                elif split:
+                    fetch = executor.submit(self._fetch_raw, list(batch))
+                    in_flight.append((fetch, _chain(fetch, transform_executor, self._transform)))
+                else:
+                    fetch = executor.submit(self._fetch_samples, list(batch))
+                    in_flight.append((fetch, _chain(fetch, transform_executor, _collate_and_transform, self._collate_fn, self._batch_transform)))
+                if len(in_flight) >= self._prefetch_batches:
+                    yield in_flight.popleft()[1].result()
+            while in_flight:
+                yield in_flight.popleft()[1].result()
+        finally:
+            for fetch, _ in in_flight:
+                fetch.cancel()
+            executor.shutdown(wait=False)
+            if transform_executor is not None:
+                transform_executor.shutdown(wait=False, cancel_futures=True)
@@ -1,162 +1,462 @@
-from typing import Callable
+import time
+from typing import Callable, Optional, Sequence, Union
 
-from torch.utils.data import Dataset
 import upstash_redis
 
+from upstash_dataset.BaseDataset import UpstashDataset, identity
+from upstash_dataset.Chunking import AdaptiveChunker
+from upstash_dataset.Clients import client_url, lazy_client
+from upstash_dataset.Codec import Codec
+from upstash_dataset.Metrics import Metrics
+from upstash_dataset.Retry import RetryPolicy
 
-class RedisListDataset(Dataset):
+
+def _coalesce_ranges(idx, gap_tolerance: int):
+    """
+    Groups the requested indices into runs that can be fetched with a single range command
+
+    :param idx: Requested indices, in any order and possibly with duplicates
+    :param gap_tolerance: Maximum number of unrequested elements allowed between two consecutive indices of a run
+    :return: List of inclusive [start, stop] runs sorted by start
+    """
+    runs = []
+    for i in sorted(set(idx)):
+        # Ranges with a negative start are clamped by Redis, so negative indices are fetched one by one
+        if runs and runs[-1][0] >= 0 and i - runs[-1][1] <= gap_tolerance + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+
+def _scatter_ranges(idx, runs, results):
+    """
+    Maps the results of range commands back to the requested indices
+
+    :param idx: Requested indices in the caller's order
+    :param runs: Runs returned by _coalesce_ranges
+    :param results: Result of the range command for each run
+    :return: Dictionary from requested index to fetched element, indices out of range are missing
+    """
+    requested = set(idx)
+    fetched = {}
+    for (start, stop), values in zip(runs, results):
+        for i in range(start, min(stop + 1, start + len(values))):
+            if i in requested:
+                fetched[i] = values[i - start]
+    return fetched
+
+
+def _mapping_identity(key_mapping: Callable, length: int) -> str:
+    """
+    Identifies a key mapping by the keys of a few indices spread over the dataset, so that mappings agreeing on their first key are told apart
+
+    :param key_mapping: Function mapping the index to the Redis key
+    :param length: Number of samples
+    """
+    indices = sorted({i for i in (0, 1, length // 2, length - 1) if 0 <= i < length})
+    return ','.join(str(key_mapping(i)) for i in indices)
+
+
+class RedisDataset(UpstashDataset):
+    """
+    Base class for the Upstash Redis datasets
+
+    Batches are fetched with a single pipeline. Subclasses add the commands for a batch to the pipeline in _build and turn the pipeline results into raw samples in _decode.
+
+    With a codec, values are stored encoded and __getitems__ decodes a whole batch at once, such as into a single tensor. The transform is applied to every decoded sample, and the batch is returned as decoded when the transform is the identity.
+    A batch_transform is applied to the batch returned by __getitems__, after the transform, for functions running once per batch on the decoded tensor.
+    """
+    _redis: upstash_redis.Redis
+    _codec: Optional[Codec] = None
+    _batch_transform: Optional[Callable] = None
+
+    def _codec_identity(self) -> str:
+        """
+        :return: Suffix of the identity describing the codec, empty without a codec
+        """
+        return '' if self._codec is None else f':{self._codec!r}'
+
+    def _transform_item(self, sample):
+        if self._codec is None:
+            return self._transform(sample)
+        return self._transform(self._codec.decode_batch([sample])[0])
+
+    def _transform_items(self, samples):
+        if self._codec is None:
+            batch = [self._transform(i) for i in samples]
+        else:
+            batch = self._codec.decode_batch(samples)
+            if self._transform is not identity:
+                batch = [self._transform(i) for i in batch]
+        return batch if self._batch_transform is None else self._batch_transform(batch)
+
+    def _build(self, pipeline, idx):
+        """
+        :param pipeline: Pipeline to add the commands to
+        :param idx: Indices of the samples
+        :return: Plan passed to _decode along with the pipeline results
+        """
+        raise NotImplementedError
+
+    def _decode(self, idx, plan, results):
+        """
+        :param idx: Indices of the samples
+        :param plan: Plan returned by _build
+        :param results: Results of the pipeline commands
+        :return: Raw samples in the order of idx
+        """
+        raise NotImplementedError
+
+    def _fetch_chunk(self, idx):
+        metrics = self._metrics
+        if metrics is None:
+            pipeline = self._redis.pipeline()
+            plan = self._build(pipeline, idx)
+            return self._decode(idx, plan, pipeline.exec())
+        start = time.perf_counter()
+        pipeline = self._redis.pipeline()
+        plan = self._build(pipeline, idx)
+        built = time.perf_counter()
+        results = pipeline.exec()
+        executed = time.perf_counter()
+        samples = self._decode(idx, plan, results)
+        metrics.record_request(type(self).__name__, start, built, executed, time.perf_counter(), len(idx), len(results), results)
+        return samples
+
+
+class RedisListDataset(RedisDataset):
     """
     Dataset class for Upstash Redis List
 
     This class allows you to use Upstash Redis List as a PyTorch Dataset and allows easy integration for training models. Each element in the list is treated as a sample.
     """
-    def __init__(self, redis: upstash_redis.Redis, key: str, transform: Callable = lambda x: x):
+    def __init__(self, redis: upstash_redis.Redis, key: str, transform: Callable = identity, gap_tolerance: int = 0, codec: Optional[Codec] = None, batch_transform: Optional[Callable] = None, length_ttl: Optional[float] = None, chunker: Optional[AdaptiveChunker] = None, metrics: Optional[Metrics] = None, retry: Optional[RetryPolicy] = None):
         """
         :param redis: Upstash Redis client
         :param key: Redis key to the list
         :param transform: Function to transform the retrieved value before returning
+        :param gap_tolerance: Maximum number of unrequested elements fetched to merge two batch indices into a single LRANGE
+        :param codec: Encoding of the stored values, decoded a batch at a time, None to return the values as they are stored
+        :param batch_transform: Function to transform the batches returned by __getitems__, such as the decoded tensor of a codec
+        :param length_ttl: Seconds to cache the length for, None to cache it until refresh or set_epoch is called and 0 to disable caching
+        :param chunker: Splits batches into concurrently fetched chunks sized by the observed response sizes, None to fetch each batch with a single request
+        :param metrics: Records the timings and sizes of requests, None to disable instrumentation
+        :param retry: Retries, splits and hedges failed or slow requests, None to fail on the first error
         """
-        self._redis = redis
+        self._redis = lazy_client(redis)
         self._key = key
         self._transform = transform
+        self._gap_tolerance = gap_tolerance
+        self._codec = codec
+        self._batch_transform = batch_transform
+        self._length_ttl = length_ttl
+        self._chunker = chunker
+        self._metrics = metrics
+        self._retry = retry
+
+    def _identity(self):
+        return f'list:{client_url(self._redis)}:{self._key}{self._codec_identity()}'
 
-    def __len__(self):
+    def _length(self):
         return self._redis.llen(self._key)
 
-    def __getitem__(self, idx):
-        return self._transform(self._redis.lindex(self._key, idx))
+    def _fetch_item(self, idx):
+        return self._timed_fetch(lambda: self._redis.lindex(self._key, idx), 1)
 
-    def __getitems__(self, idx):
-        pipeline = self._redis.pipeline()
-        for i in idx:
-            pipeline.lindex(self._key, i)
-        return [self._transform(i) for i in pipeline.exec()]
+    def _build(self, pipeline, idx):
+        runs = _coalesce_ranges(idx, self._gap_tolerance)
+        for start, stop in runs:
+            pipeline.lrange(self._key, start, stop)
+        return runs
 
+    def _decode(self, idx, plan, results):
+        fetched = _scatter_ranges(idx, plan, results)
+        return [fetched.get(i) for i in idx]
 
-class RedisSortedSetDataset(Dataset):
+
+class RedisSortedSetDataset(RedisDataset):
     """
     Dataset class for Upstash Redis Sorted Set
 
     This class allows you to use Upstash Redis Sorted Set as a PyTorch Dataset and allows easy integration for training models. Each element in the sorted set is treated as a sample.
+
+    With min_score or max_score, the dataset holds only the members in the score range, with the same bounds as ZRANGEBYSCORE such as '(1.5' or '+inf'.
+    The rank of the first member in the range is resolved with ZCOUNT along with the length and cached in the same way, so that samples are still fetched by rank.
     """
-    def __init__(self, redis: upstash_redis.Redis, key: str, transform: Callable = lambda x: x):
+    def __init__(self, redis: upstash_redis.Redis, key: str, transform: Callable = identity, gap_tolerance: int = 0,
+                 min_score: Union[float, str] = '-inf', max_score: Union[float, str] = '+inf', length_ttl: Optional[float] = None, chunker: Optional[AdaptiveChunker] = None, metrics: Optional[Metrics] = None, retry: Optional[RetryPolicy] = None):
         """
         :param redis: Upstash Redis client
         :param key: Redis key to the sorted set
         :param transform: Function to transform the retrieved value before returning
+        :param gap_tolerance: Maximum number of unrequested members fetched to merge two batch indices into a single ZRANGE
+        :param min_score: Minimum score of the members in the dataset, prefixed with '(' to exclude it
+        :param max_score: Maximum score of the members in the dataset, prefixed with '(' to exclude it
+        :param length_ttl: Seconds to cache the length for, None to cache it until refresh or set_epoch is called and 0 to disable caching
+        :param chunker: Splits batches into concurrently fetched chunks sized by the observed response sizes, None to fetch each batch with a single request
+        :param metrics: Records the timings and sizes of requests, None to disable instrumentation
+        :param retry: Retries, splits and hedges failed or slow requests, None to fail on the first error
         """
-        self._redis = redis
+        self._redis = lazy_client(redis)
         self._key = key
         self._transform = transform
+        self._gap_tolerance = gap_tolerance
+        self._score_range = None
+        if str(min_score) != '-inf' or str(max_score) not in ('+inf', 'inf'):
+            self._score_range = (str(min_score), str(max_score))
+        self._offset = 0
+        self._length_ttl = length_ttl
+        self._chunker = chunker
+        self._metrics = metrics
+        self._retry = retry
 
-    def __len__(self):
-        return self._redis.zcard(self._key)
+    def _identity(self):
+        if self._score_range is not None:
+            return f'zset:{client_url(self._redis)}:{self._key}:{self._score_range[0]}:{self._score_range[1]}'
+        return f'zset:{client_url(self._redis)}:{self._key}'
 
-    def __getitem__(self, idx):
-        return self._transform(self._redis.zrange(self._key, idx, idx, withscores=True)[0])
+    def _count_range(self, pipeline):
+        min_score, max_score = self._score_range
+        pipeline.zcount(self._key, min_score, max_score)
+        if min_score != '-inf':
+            pipeline.zcount(self._key, '-inf', min_score[1:] if min_score.startswith('(') else '(' + min_score)
 
-    def __getitems__(self, idx):
+    def _apply_range(self, results) -> int:
+        self._offset = results[1] if len(results) > 1 else 0
+        return results[0]
+
+    def _length(self):
+        if self._score_range is None:
+            return self._redis.zcard(self._key)
         pipeline = self._redis.pipeline()
+        self._count_range(pipeline)
+        return self._apply_range(pipeline.exec())
+
+    def _ranks(self, idx):
+        """
+        Maps indices in the score range to ranks in the sorted set, the length must be cached
+        """
+        length = self._length_cache[0]
+        ranks = []
         for i in idx:
-            pipeline.zrange(self._key, i, i, withscores=True)
-        return [self._transform(i[0]) for i in pipeline.exec()]
+            if i < -length or i >= length:
+                raise IndexError("Index out of range")
+            ranks.append(self._offset + i % length)
+        return ranks
+
+    def _fetch_item(self, idx):
+        if self._score_range is not None:
+            self._cached_length()
+            idx = self._ranks([idx])[0]
+        return self._timed_fetch(lambda: self._redis.zrange(self._key, idx, idx, withscores=True), 1)[0]
 
+    def _fetch_chunk(self, idx):
+        if self._score_range is not None:
+            self._cached_length()
+        return super()._fetch_chunk(idx)
 
-class RedisStringDataset(Dataset):
+    def _build(self, pipeline, idx):
+        # The ranks are resolved once and carried in the plan, as the cached offset may change before the results are decoded
+        ranks = self._ranks(idx) if self._score_range is not None else list(idx)
+        runs = _coalesce_ranges(ranks, self._gap_tolerance)
+        for start, stop in runs:
+            pipeline.zrange(self._key, start, stop, withscores=True)
+        return ranks, runs
+
+    def _decode(self, idx, plan, results):
+        ranks, runs = plan
+        fetched = _scatter_ranges(ranks, runs, results)
+        if len(fetched) != len(set(ranks)):
+            raise IndexError("Index out of range")
+        return [fetched[i] for i in ranks]
+
+
+class RedisStringDataset(RedisDataset):
     """
     Dataset class for Upstash Redis String
 
     This class allows you to use Upstash Redis Strings stored in different keys as a PyTorch Dataset and allows easy integration for training models. Each string stored in a different key is treated as a sample.
     """
-    def __init__(self, redis: upstash_redis.Redis, key_mapping: Callable, length_function: Callable, transform: Callable = lambda x: x):
+    def __init__(self, redis: upstash_redis.Redis, key_mapping: Callable, length_function: Callable, transform: Callable = identity, codec: Optional[Codec] = None, batch_transform: Optional[Callable] = None, length_ttl: Optional[float] = None, chunker: Optional[AdaptiveChunker] = None, metrics: Optional[Metrics] = None, retry: Optional[RetryPolicy] = None):
         """
         :param redis: Upstash Redis client
         :param key_mapping: Function to map the index to the Redis key
         :param length_function: Function to get the length of the dataset
         :param transform: Function to transform the retrieved value before returning
+        :param codec: Encoding of the stored values, decoded a batch at a time, None to return the values as they are stored
+        :param batch_transform: Function to transform the batches returned by __getitems__, such as the decoded tensor of a codec
+        :param length_ttl: Seconds to cache the length for, None to cache it until refresh or set_epoch is called and 0 to disable caching
+        :param chunker: Splits batches into concurrently fetched chunks sized by the observed response sizes, None to fetch each batch with a single request
+        :param metrics: Records the timings and sizes of requests, None to disable instrumentation
+        :param retry: Retries, splits and hedges failed or slow requests, None to fail on the first error
         """
-        self._redis = redis
+        self._redis = lazy_client(redis)
         self._length_function = length_function
         self._key_mapping = key_mapping
         self._transform = transform
+        self._codec = codec
+        self._batch_transform = batch_transform
+        self._length_ttl = length_ttl
+        self._chunker = chunker
+        self._metrics = metrics
+        self._retry = retry
+
+    def _identity(self):
+        return f'string:{client_url(self._redis)}:{_mapping_identity(self._key_mapping, len(self))}{self._codec_identity()}'
 
-    def __len__(self):
+    def _length(self):
         return self._length_function()
 
-    def __getitem__(self, idx):
-        return self._transform(self._redis.get(self._key_mapping(idx)))
+    def _fetch_item(self, idx):
+        return self._timed_fetch(lambda: self._redis.get(self._key_mapping(idx)), 1)
 
-    def __getitems__(self, idx):
-        pipeline = self._redis.pipeline()
+    def _build(self, pipeline, idx):
         for i in idx:
             pipeline.get(self._key_mapping(i))
-        return [self._transform(i) for i in pipeline.exec()]
+
+    def _decode(self, idx, plan, results):
+        return results
 
 
-class RedisJsonArrayDataset(Dataset):
+class RedisJsonArrayDataset(RedisDataset):
     """
     Dataset class for Upstash Redis JSON Array
 
     This class allows you to use Upstash Redis JSON Array as a PyTorch Dataset and allows easy integration for training models. Each element in the JSON array is treated as a sample.
+
+    Batches are fetched with a single JSON.GET, with a slice path for each run of contiguous indices.
+    If fields are given, only these sub-paths of each element are fetched and samples are dictionaries from field to value, every element must contain all the fields.
     """
-    def __init__(self, redis: upstash_redis.Redis, key: str, array_path: str = '$', transform: Callable = lambda x: x):
+    def __init__(self, redis: upstash_redis.Redis, key: str, array_path: str = '$', transform: Callable = identity, fields: Optional[Sequence[str]] = None, gap_tolerance: int = 0, codec: Optional[Codec] = None, batch_transform: Optional[Callable] = None, length_ttl: Optional[float] = None, chunker: Optional[AdaptiveChunker] = None, metrics: Optional[Metrics] = None, retry: Optional[RetryPolicy] = None):
         """
         :param redis: Upstash Redis client
         :param key: Redis key to the JSON object
         :param array_path: Path to the array in the JSON object
         :param transform: Function to transform the retrieved value before returning
+        :param fields: Paths relative to each element to fetch, such as 'label' or 'meta.id', None to fetch whole elements
+        :param gap_tolerance: Maximum number of unrequested elements fetched to merge two batch indices into a single slice
+        :param codec: Encoding of the stored values, decoded a batch at a time, None to return the values as they are stored
+        :param batch_transform: Function to transform the batches returned by __getitems__, such as the decoded tensor of a codec
+        :param length_ttl: Seconds to cache the length for, None to cache it until refresh or set_epoch is called and 0 to disable caching
+        :param chunker: Splits batches into concurrently fetched chunks sized by the observed response sizes, None to fetch each batch with a single request
+        :param metrics: Records the timings and sizes of requests, None to disable instrumentation
+        :param retry: Retries, splits and hedges failed or slow requests, None to fail on the first error
         """
-        self._redis = redis
+        self._redis = lazy_client(redis)
         self._key = key
         self._array_path = array_path
         self._transform = transform
+        if fields is not None and codec is not None:
+            raise ValueError("Fields can not be combined with a codec")
+        self._fields = None if fields is None else list(fields)
+        self._gap_tolerance = gap_tolerance
+        self._codec = codec
+        self._batch_transform = batch_transform
+        self._length_ttl = length_ttl
+        self._chunker = chunker
+        self._metrics = metrics
+        self._retry = retry
+
+    def _identity(self):
+        fields = '' if self._fields is None else ':' + ','.join(sorted(self._fields))
+        return f'json-array:{client_url(self._redis)}:{self._key}:{self._array_path}{fields}{self._codec_identity()}'
 
-    def __len__(self):
+    def _length(self):
         l = self._redis.json.arrlen(self._key, self._array_path)
         if type(l) == int:
             return l
         return l[0]
 
-    def __getitem__(self, idx):
-        return self._transform(self._redis.json.get(self._key, f'{self._array_path}[{idx}]')[0])
+    def _paths(self, runs):
+        paths = []
+        for start, stop in runs:
+            run = f'{self._array_path}[{start}]' if start == stop else f'{self._array_path}[{start}:{stop + 1}]'
+            if self._fields is None:
+                paths.append(run)
+            else:
+                paths.extend(run + (field if field[0] in '.[' else '.' + field) for field in self._fields)
+        return paths
 
-    def __getitems__(self, idx):
-        pipeline = self._redis.pipeline()
-        for i in idx:
-            pipeline.json.get(self._key, f'{self._array_path}[{i}]')
-        return [self._transform(i[0]) for i in pipeline.exec()]
+    def _fetch_item(self, idx):
+        return self._fetch_chunk([idx])[0]
+
+    def _build(self, pipeline, idx):
+        runs = _coalesce_ranges(idx, self._gap_tolerance)
+        pipeline.json.get(self._key, *self._paths(runs))
+        return runs
+
+    def _decode(self, idx, plan, results):
+        paths = self._paths(plan)
+        matches = results[0]
+        if matches is None:
+            raise IndexError("Index out of range")
+        if len(paths) == 1:
+            matches = {paths[0]: matches}
+        if self._fields is None:
+            fetched = _scatter_ranges(idx, plan, [matches[path] for path in paths])
+        else:
+            values = []
+            names = [field.lstrip('.') for field in self._fields]
+            for r in range(len(plan)):
+                columns = [matches[path] for path in paths[r * len(names):(r + 1) * len(names)]]
+                if any(len(column) != len(columns[0]) for column in columns):
+                    raise ValueError(f"Fields {self._fields} are missing from some elements of {self._array_path}")
+                values.append([dict(zip(names, row)) for row in zip(*columns)])
+            fetched = _scatter_ranges(idx, plan, values)
+        if len(fetched) < len(set(idx)):
+            raise IndexError("Index out of range")
+        return [fetched[i] for i in idx]
 
 
-class RedisJsonObjectDataset(Dataset):
+class RedisJsonObjectDataset(RedisDataset):
     """
     Dataset class for Upstash Redis JSON Object
 
     This class allows you to use Upstash Redis JSON Objects stored in different keys as a PyTorch Dataset and allows easy integration for training models. Each JSON object stored in a different key is treated as a sample.
     """
-    def __init__(self, redis: upstash_redis.Redis, key_mapping: Callable, length_function: Callable, object_path: str, transform: Callable = lambda x: x):
+    def __init__(self, redis: upstash_redis.Redis, key_mapping: Callable, length_function: Callable, object_path: str, transform: Callable = identity, codec: Optional[Codec] = None, batch_transform: Optional[Callable] = None, length_ttl: Optional[float] = None, chunker: Optional[AdaptiveChunker] = None, metrics: Optional[Metrics] = None, retry: Optional[RetryPolicy] = None):
         """
         :param redis: Upstash Redis client
         :param key_mapping: Function to map the index to the Redis JSON key
         :param length_function: Function to get the length of the dataset
         :param object_path: Path to the value to be retrieved in the JSON objects
         :param transform: Function to transform the retrieved value before returning
+        :param codec: Encoding of the stored values, decoded a batch at a time, None to return the values as they are stored
+        :param batch_transform: Function to transform the batches returned by __getitems__, such as the decoded tensor of a codec
+        :param length_ttl: Seconds to cache the length for, None to cache it until refresh or set_epoch is called and 0 to disable caching
+        :param chunker: Splits batches into concurrently fetched chunks sized by the observed response sizes, None to fetch each batch with a single request
+        :param metrics: Records the timings and sizes of requests, None to disable instrumentation
+        :param retry: Retries, splits and hedges failed or slow requests, None to fail on the first error
         """
-        self._redis = redis
+        self._redis = lazy_client(redis)
         self._key_mapping = key_mapping
         self._length_function = length_function
         self._object_path = object_path
         self._transform = transform
+        self._codec = codec
+        self._batch_transform = batch_transform
+        self._length_ttl = length_ttl
+        self._chunker = chunker
+        self._metrics = metrics
+        self._retry = retry
 
-    def __len__(self):
+    def _identity(self):
+        return f'json-object:{client_url(self._redis)}:{_mapping_identity(self._key_mapping, len(self))}:{self._object_path}{self._codec_identity()}'
+
+    def _length(self):
         return self._length_function()
 
-    def __getitem__(self, idx):
+    def _fetch_item(self, idx):
         if self._object_path == '' or self._object_path == '$':
-            return self._transform(self._redis.json.get(self._key_mapping(idx)))
-        return self._transform(self._redis.json.get(self._key, self._object_path)[0])
+            return self._timed_fetch(lambda: self._redis.json.get(self._key_mapping(idx)), 1)
+        return self._timed_fetch(lambda: self._redis.json.get(self._key_mapping(idx), self._object_path), 1)[0]
+
+    def _build(self, pipeline, idx):
+        pipeline.json.mget([self._key_mapping(i) for i in idx], self._object_path)
 
-    def __getitems__(self, idx):
-        result = self._redis.json.mget([self._key_mapping(i) for i in idx], self._object_path)
+    def _decode(self, idx, plan, results):
         if self._object_path == '' or self._object_path == '$':
-            return [self._transform(i) for i in result]
-        return [self._transform(i[0]) for i in result]
\ No newline at end of file
+            return results[0]
+        return [i[0] for i in results[0]]
+
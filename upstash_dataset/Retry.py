@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Sequence
+
+import httpx
+import upstash_redis.errors
+import upstash_vector.errors
+
+from upstash_dataset.Metrics import Metrics
+
+
+_RATE_LIMIT_MESSAGES = ('limit exceeded', 'too many requests', 'rate limit')
+_TRANSIENT_MESSAGES = _RATE_LIMIT_MESSAGES + ('timeout', 'timed out', 'temporarily', 'unavailable', 'try again')
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, (upstash_redis.errors.UpstashError, upstash_vector.errors.UpstashError)) and any(m in str(error).lower() for m in _RATE_LIMIT_MESSAGES)
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Default retry condition of RetryPolicy
+
+    :param error: Error raised by a fetch
+    :return: Whether the error is a network failure, a response that is not JSON such as a gateway error page, or an Upstash error reporting a rate limit or a temporary failure
+    """
+    if isinstance(error, (httpx.TransportError, json.JSONDecodeError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, (upstash_redis.errors.UpstashError, upstash_vector.errors.UpstashError)):
+        return any(m in str(error).lower() for m in _TRANSIENT_MESSAGES)
+    return False
+
+
+class RetryPolicy:
+    """
+    Retries, deadlines and hedging for the requests made by datasets
+
+    Failed requests are retried up to max_attempts times after an exponential backoff with full jitter, waiting at least rate_limit_delay after a rate limit error.
+    With split_on_failure, a batch whose request failed is retried as two halves, so that a batch too large to be served in time is still fetched.
+    With a deadline, each batch, including its retries, fails with a TimeoutError once deadline seconds have passed. Requests are then run on a thread pool, and requests that missed the deadline are abandoned rather than cancelled.
+    With hedge, a duplicate request is sent when a request is still running after the hedge_quantile latency of the recent requests, and the first response is used. Requests only read data, so duplicates are safe.
+
+    A policy can be passed to any dataset class with the retry parameter, and can be shared by several datasets. Retries, splits, hedges and missed deadlines are counted in the dataset's metrics.
+    The Upstash clients retry failed requests on their own after a fixed interval, create them with rest_retries=0 to leave retries to the policy.
+    """
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.05, max_delay: float = 2.0, rate_limit_delay: float = 1.0,
+                 deadline: Optional[float] = None, split_on_failure: bool = True, min_split_size: int = 1,
+                 hedge: bool = False, hedge_quantile: float = 0.95, hedge_min_observations: int = 20, latency_window: int = 256,
+                 max_concurrency: int = 8, retry_on: Callable[[Exception], bool] = is_transient, seed: Optional[int] = None):
+        """
+        :param max_attempts: Maximum number of attempts of each request, including the first
+        :param base_delay: Backoff before the first retry in seconds, doubled with every further retry
+        :param max_delay: Maximum backoff in seconds
+        :param rate_limit_delay: Minimum backoff in seconds after a rate limit error
+        :param deadline: Seconds a batch may take including its retries, None to wait for it indefinitely
+        :param split_on_failure: Whether to retry a failed batch as two halves
+        :param min_split_size: Minimum number of samples of a half
+        :param hedge: Whether to send duplicates of slow requests
+        :param hedge_quantile: Quantile of the recent request latencies after which a duplicate is sent
+        :param hedge_min_observations: Number of requests observed before duplicates are sent
+        :param latency_window: Number of recent request latencies the quantile is computed from
+        :param max_concurrency: Maximum number of requests running on the thread pool, used for deadlines and hedging
+        :param retry_on: Function deciding whether an error is retried
+        :param seed: Seed of the backoff jitter, None for a random seed
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._rate_limit_delay = rate_limit_delay
+        self._deadline = deadline
+        self._split_on_failure = split_on_failure
+        self._min_split_size = max(min_split_size, 1)
+        self._hedge = hedge
+        self._hedge_quantile = hedge_quantile
+        self._hedge_min_observations = hedge_min_observations
+        self._latency_window = latency_window
+        self._max_concurrency = max_concurrency
+        self._retry_on = retry_on
+        self._seed = seed
+        self._random = random.Random(seed)
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['_executor'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """
+        :param attempt: Number of failed attempts so far
+        :param error: Error of the last attempt
+        :return: Seconds to wait before the next attempt
+        """
+        with self._lock:
+            delay = self._random.uniform(0, min(self._max_delay, self._base_delay * 2 ** (attempt - 1)))
+        if error is not None and _is_rate_limit(error):
+            delay = max(delay, self._rate_limit_delay)
+        return delay
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        :return: Seconds after which a duplicate of a running request is sent, None if hedging is disabled or not enough requests were observed
+        """
+        if not self._hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self._hedge_min_observations:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(int(self._hedge_quantile * len(ordered)), len(ordered) - 1)]
+
+    def observe(self, seconds: float):
+        """
+        Adds the latency of a successful request to the recent latencies
+
+        :param seconds: Latency of the request
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._pid != os.getpid():
+            # A forked worker inherits the pool of its parent without its threads, and possibly a held lock
+            self._lock = threading.Lock()
+            self._executor = None
+            self._pid = os.getpid()
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='upstash-retry')
+        return self._executor
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+    def _attempt(self, fn: Callable, args: tuple, deadline: Optional[float], metrics: Optional[Metrics]):
+        delay = self.hedge_delay()
+        start = time.monotonic()
+        if delay is None and deadline is None:
+            result = fn(*args)
+            self.observe(time.monotonic() - start)
+            return result
+        executor = self._get_executor()
+        pending = {executor.submit(fn, *args)}
+        hedged = delay is None
+        error = None
+        while pending:
+            timeout = self._remaining(deadline)
+            if not hedged:
+                until_hedge = max(start + delay - time.monotonic(), 0.0)
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.observe(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+            if not done:
+                if not hedged and (deadline is None or time.monotonic() < deadline):
+                    hedged = True
+                    pending.add(executor.submit(fn, *args))
+                    if metrics is not None:
+                        metrics.count('hedges')
+                elif deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("Request missed its deadline")
+        raise error
+
+    def _retrying(self, fn: Callable, args: tuple, attempt: int, deadline: Optional[float], metrics: Optional[Metrics], split: Optional[Sequence] = None):
+        while True:
+            try:
+                return self._attempt(fn, args if split is None else (split,), deadline, metrics)
+            except Exception as error:
+                if deadline is not None and time.monotonic() >= deadline:
+                    if metrics is not None:
+                        metrics.count('deadlines_exceeded')
+                    if isinstance(error, TimeoutError):
+                        raise
+                    raise TimeoutError("Batch missed its deadline") from error
+                attempt += 1
+                if attempt >= self._max_attempts or not self._retry_on(error):
+                    raise
+                delay = self.backoff(attempt, error)
+                remaining = self._remaining(deadline)
+                if remaining is not None and delay >= remaining:
+                    if metrics is not None:
+                        metrics.count('deadlines_exceeded')
+                    raise TimeoutError("Batch missed its deadline") from error
+                if metrics is not None:
+                    metrics.count('retries')
+                time.sleep(delay)
+                if split is not None and self._split_on_failure and len(split) >= 2 * self._min_split_size:
+                    if metrics is not None:
+                        metrics.count('splits')
+                    half = len(split) // 2
+                    return (self._retrying(fn, args, attempt, deadline, metrics, split[:half]) +
+                            self._retrying(fn, args, attempt, deadline, metrics, split[half:]))
+
+    def call(self, fn: Callable, *args, metrics: Optional[Metrics] = None):
+        """
+        Calls a function fetching a single sample, retrying and hedging it
+
+        :param fn: Function to call
+        :param args: Arguments of fn
+        :param metrics: Metrics to count retries, hedges and missed deadlines in
+        :return: Result of fn
+        """
+        deadline = None if self._deadline is None else time.monotonic() + self._deadline
+        return self._retrying(fn, args, 0, deadline, metrics)
+
+    def fetch(self, fetch: Callable[[List], List], idx: Sequence, metrics: Optional[Metrics] = None) -> List:
+        """
+        Fetches a batch, retrying, splitting and hedging its requests
+
+        :param fetch: Function fetching the raw samples of a list of indices
+        :param idx: Indices of the samples
+        :param metrics: Metrics to count retries, splits, hedges and missed deadlines in
+        :return: Raw samples in the order of idx
+        """
+        deadline = None if self._deadline is None else time.monotonic() + self._deadline
+        return self._retrying(fetch, (), 0, deadline, metrics, list(idx))
+
+    async def _aattempt(self, fetch: Callable, idx: List, deadline: Optional[float], metrics: Optional[Metrics]):
+        delay = self.hedge_delay()
+        start = time.monotonic()
+        pending = {asyncio.ensure_future(fetch(idx))}
+        hedged = delay is None
+        error = None
+        try:
+            while pending:
+                timeout = self._remaining(deadline)
+                if not hedged:
+                    until_hedge = max(start + delay - time.monotonic(), 0.0)
+                    timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.observe(time.monotonic() - start)
+                        return task.result()
+                    error = task.exception()
+                if not done:
+                    if not hedged and (deadline is None or time.monotonic() < deadline):
+                        hedged = True
+                        pending.add(asyncio.ensure_future(fetch(idx)))
+                        if metrics is not None:
+                            metrics.count('hedges')
+                    elif deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("Request missed its deadline")
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _aretrying(self, fetch: Callable, idx: List, attempt: int, deadline: Optional[float], metrics: Optional[Metrics]):
+        while True:
+            try:
+                return await self._aattempt(fetch, idx, deadline, metrics)
+            except Exception as error:
+                if deadline is not None and time.monotonic() >= deadline:
+                    if metrics is not None:
+                        metrics.count('deadlines_exceeded')
+                    if isinstance(error, TimeoutError):
+                        raise
+                    raise TimeoutError("Batch missed its deadline") from error
+                attempt += 1
+                if attempt >= self._max_attempts or not self._retry_on(error):
+                    raise
+                delay = self.backoff(attempt, error)
+                remaining = self._remaining(deadline)
+                if remaining is not None and delay >= remaining:
+                    if metrics is not None:
+                        metrics.count('deadlines_exceeded')
+                    raise TimeoutError("Batch missed its deadline") from error
+                if metrics is not None:
+                    metrics.count('retries')
+                await asyncio.sleep(delay)
+                if self._split_on_failure and len(idx) >= 2 * self._min_split_size:
+                    if metrics is not None:
+                        metrics.count('splits')
+                    half = len(idx) // 2
+                    halves = await asyncio.gather(self._aretrying(fetch, idx[:half], attempt, deadline, metrics),
+                                                  self._aretrying(fetch, idx[half:], attempt, deadline, metrics))
+                    return halves[0] + halves[1]
+
+    async def afetch(self, fetch: Callable, idx: Sequence, metrics: Optional[Metrics] = None) -> List:
+        """
+        Asyncio version of fetch, with the halves of a split batch fetched concurrently
+
+        :param fetch: Coroutine function fetching the raw samples of a list of indices
+        :param idx: Indices of the samples
+        :param metrics: Metrics to count retries, splits, hedges and missed deadlines in
+        :return: Raw samples in the order of idx
+        """
+        deadline = None if self._deadline is None else time.monotonic() + self._deadline
+        return await self._aretrying(fetch, list(idx), 0, deadline, metrics)
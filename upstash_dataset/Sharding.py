@@ -0,0 +1,116 @@
+import math
+import random
+from typing import Iterator, List, Optional, Sequence, Sized, Tuple
+
+import torch.distributed
+from torch.utils.data import Sampler, get_worker_info
+
+
+def get_shard_info() -> Tuple[int, int]:
+    """
+    Returns the shard the current process reads, combining the torch.distributed rank with the DataLoader worker id
+
+    :return: Index of the current shard and total number of shards
+    """
+    rank, world_size = 0, 1
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        rank = torch.distributed.get_rank()
+        world_size = torch.distributed.get_world_size()
+    worker = get_worker_info()
+    if worker is None:
+        return rank, world_size
+    return rank * worker.num_workers + worker.id, world_size * worker.num_workers
+
+
+class BlockShardSampler(Sampler):
+    """
+    Sampler splitting a dataset into contiguous blocks of indices shared between torch.distributed ranks
+
+    Each rank reads whole blocks in order, so that batches fall into few contiguous ranges which Redis datasets fetch with range commands, and each rank touches a stable part of the data.
+    The order of the blocks is shuffled in every epoch set with set_epoch. With reassign_blocks, blocks move between ranks across epochs, otherwise every rank keeps the same blocks and only shuffles their order.
+    Like DistributedSampler, ranks are padded to the same number of samples by repeating indices from the start of the order, unless drop_last is set, and every other index is read by exactly one rank. Without reassign_blocks, the indices are split between ranks by sample count, so a block may be shared by two ranks.
+    """
+    def __init__(self, dataset: Sized, block_size: int = 1024, shuffle: bool = True, seed: int = 0,
+                 num_replicas: Optional[int] = None, rank: Optional[int] = None, drop_last: bool = False,
+                 reassign_blocks: bool = True, shuffle_within_blocks: bool = False):
+        """
+        :param dataset: Dataset to sample from
+        :param block_size: Number of contiguous indices in each block
+        :param shuffle: Whether to shuffle the order of the blocks
+        :param seed: Seed of the shuffle, combined with the epoch set by set_epoch
+        :param num_replicas: Number of ranks, defaults to the torch.distributed world size
+        :param rank: Rank of the current process, defaults to the torch.distributed rank
+        :param drop_last: Whether to drop the samples that can not be split evenly instead of padding
+        :param reassign_blocks: Whether blocks are assigned to ranks anew in every epoch
+        :param shuffle_within_blocks: Whether to shuffle the indices inside each block
+        """
+        if num_replicas is None or rank is None:
+            distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
+            if num_replicas is None:
+                num_replicas = torch.distributed.get_world_size() if distributed else 1
+            if rank is None:
+                rank = torch.distributed.get_rank() if distributed else 0
+        if rank < 0 or rank >= num_replicas:
+            raise ValueError(f"Invalid rank {rank}, rank should be in the interval [0, {num_replicas - 1}]")
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self._dataset = dataset
+        self._block_size = block_size
+        self._shuffle = shuffle
+        self._seed = seed
+        self._num_replicas = num_replicas
+        self._rank = rank
+        self._drop_last = drop_last
+        self._reassign_blocks = reassign_blocks
+        self._shuffle_within_blocks = shuffle_within_blocks
+        self._epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """
+        :param epoch: Epoch number, used to shuffle differently in every epoch
+        """
+        self._epoch = epoch
+
+    def _num_samples(self, length: int) -> int:
+        if self._drop_last:
+            return length // self._num_replicas
+        return math.ceil(length / self._num_replicas)
+
+    def __len__(self):
+        return self._num_samples(len(self._dataset))
+
+    def __iter__(self) -> Iterator[int]:
+        length = len(self._dataset)
+        num_samples = self._num_samples(length)
+        blocks = [range(start, min(start + self._block_size, length)) for start in range(0, length, self._block_size)]
+        rng = random.Random(self._seed + self._epoch)
+        if not blocks:
+            return iter([])
+        if not self._reassign_blocks:
+            # Ranks keep the same slice of the unshuffled order, cut into pieces at block boundaries, and only shuffle the order of their pieces
+            indices = list(range(length))
+            total = num_samples * self._num_replicas
+            while len(indices) < total:
+                indices.extend(indices[:total - len(indices)])
+            pieces = []
+            for i in indices[self._rank * num_samples:(self._rank + 1) * num_samples]:
+                if pieces and i == pieces[-1][-1] + 1 and i % self._block_size != 0:
+                    pieces[-1].append(i)
+                else:
+                    pieces.append([i])
+            if self._shuffle:
+                rng.shuffle(pieces)
+            return iter([i for piece in pieces for i in self._order(piece, rng)])
+        if self._shuffle:
+            rng.shuffle(blocks)
+        indices = [i for block in blocks for i in self._order(block, rng)]
+        total = num_samples * self._num_replicas
+        while len(indices) < total:
+            indices.extend(indices[:total - len(indices)])
+        return iter(indices[self._rank * num_samples:(self._rank + 1) * num_samples])
+
+    def _order(self, block: Sequence[int], rng: random.Random) -> List[int]:
+        block = list(block)
+        if self._shuffle_within_blocks:
+            rng.shuffle(block)
+        return block
@@ -0,0 +1,241 @@
+import dataclasses
+import json
+import mmap
+import os
+import pickle
+from array import array
+from typing import Callable, List, Optional, Union
+
+import torch
+import upstash_vector
+
+from upstash_dataset.BaseDataset import UpstashDataset, identity
+from upstash_dataset.Clients import client_url
+from upstash_dataset.VectorDataset import VectorBatch, _first_row
+from upstash_dataset.VectorIterableDataset import VectorIterableDataset
+
+_VERSION = 1
+_CHECKPOINT = 'checkpoint.json'
+_RECORDS = 'records.bin'
+_OFFSETS = 'offsets.bin'
+_VECTORS = 'vectors.bin'
+
+
+def _read_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, _CHECKPOINT)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path: str, checkpoint: dict):
+    target = os.path.join(path, _CHECKPOINT)
+    with open(target + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(target + '.tmp', target)
+
+
+class _SnapshotWriter:
+    """
+    Appends samples to the files of a snapshot, truncating whatever was written after the last checkpoint
+    """
+    def __init__(self, path: str, checkpoint: dict):
+        self._path = path
+        self._checkpoint = checkpoint
+        self._files = {}
+        sizes = {_RECORDS: checkpoint['records_bytes'], _OFFSETS: 8 * checkpoint['count'],
+                 _VECTORS: 4 * checkpoint['count'] * (checkpoint['dimension'] or 0)}
+        for name, size in sizes.items():
+            f = open(os.path.join(path, name), 'a+b')
+            f.truncate(size)
+            self._files[name] = f
+
+    def write(self, samples: List, cursor: Optional[str] = None):
+        """
+        Appends a page of samples and checkpoints the progress
+
+        :param samples: Raw samples of the page
+        :param cursor: Range cursor of the next page, for snapshots of vector namespaces
+        """
+        checkpoint = self._checkpoint
+        offsets = array('Q')
+        vectors = array('f')
+        end = checkpoint['records_bytes']
+        for sample in samples:
+            if isinstance(sample, upstash_vector.types.FetchResult) and sample.vector is not None:
+                if checkpoint['dimension'] is None:
+                    if checkpoint['count'] > 0 or len(offsets) > 0:
+                        raise ValueError("Some vectors of the snapshot do not include their values")
+                    checkpoint['dimension'] = len(sample.vector)
+                if len(sample.vector) != checkpoint['dimension']:
+                    raise ValueError(f"Vector {sample.id} has dimension {len(sample.vector)} instead of {checkpoint['dimension']}")
+                vectors.extend(sample.vector)
+                sample = dataclasses.replace(sample, vector=None)
+            elif checkpoint['dimension'] is not None:
+                raise ValueError("Some vectors of the snapshot do not include their values")
+            record = pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL)
+            self._files[_RECORDS].write(record)
+            end += len(record)
+            offsets.append(end)
+        self._files[_OFFSETS].write(offsets.tobytes())
+        self._files[_VECTORS].write(vectors.tobytes())
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        checkpoint['count'] += len(samples)
+        checkpoint['records_bytes'] = end
+        if cursor is not None:
+            checkpoint['cursor'] = cursor
+        _write_checkpoint(self._path, checkpoint)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+
+def export_snapshot(dataset: Union[UpstashDataset, VectorIterableDataset], path: str, page_size: int = 1000) -> 'SnapshotDataset':
+    """
+    Exports all samples of a dataset to a local snapshot
+
+    Samples are read in pages of page_size and stored before the transform. Datasets with indices are read with their batch fetches, and a VectorIterableDataset walks its namespace with range requests.
+    Progress is checkpointed after every page, so calling this function again with the same path resumes an interrupted export.
+
+    :param dataset: Dataset to export
+    :param path: Directory to write the snapshot to
+    :param page_size: Number of samples read with each request
+    :return: Dataset reading the snapshot
+    """
+    if isinstance(dataset, VectorIterableDataset):
+        identity = f'vector-range:{client_url(dataset._index)}:{dataset._namespace}'
+    else:
+        identity = dataset._identity() or type(dataset).__name__
+    os.makedirs(path, exist_ok=True)
+    checkpoint = _read_checkpoint(path)
+    if checkpoint is not None and checkpoint['identity'] != identity:
+        raise ValueError(f"{path} holds a snapshot of {checkpoint['identity']}, not {identity}")
+    if checkpoint is None:
+        checkpoint = {'version': _VERSION, 'identity': identity, 'count': 0, 'records_bytes': 0, 'dimension': None,
+                      'cursor': '', 'length': None, 'complete': False}
+    if not checkpoint['complete']:
+        writer = _SnapshotWriter(path, checkpoint)
+        try:
+            if isinstance(dataset, VectorIterableDataset):
+                while True:
+                    result = dataset._index.range(cursor=checkpoint['cursor'], limit=page_size, namespace=dataset._namespace, **dataset._options)
+                    writer.write(result.vectors, result.next_cursor)
+                    if not result.next_cursor or not result.vectors:
+                        break
+            else:
+                if checkpoint['length'] is None:
+                    checkpoint['length'] = len(dataset)
+                while checkpoint['count'] < checkpoint['length']:
+                    start = checkpoint['count']
+                    writer.write(dataset._fetch_items(list(range(start, min(start + page_size, checkpoint['length'])))))
+        finally:
+            writer.close()
+        checkpoint['complete'] = True
+        _write_checkpoint(path, checkpoint)
+    return SnapshotDataset(path)
+
+
+class SnapshotDataset(UpstashDataset):
+    """
+    Dataset class for local snapshots
+
+    This class reads the samples of a snapshot written by export_snapshot from memory-mapped files, so that epochs are served from the page cache without any request to Upstash.
+    Vectors are stored as a contiguous float32 matrix. With output set to 'tensor', samples hold views of their rows in the mapped matrix and batches are VectorBatch objects, use batch_collate as the collate function of the DataLoader in that mode.
+    """
+    def __init__(self, path: str, transform: Callable = identity, output: str = 'object'):
+        """
+        :param path: Directory of the snapshot
+        :param transform: Function to transform the stored sample before returning
+        :param output: 'object' to return a sample at a time, 'tensor' to return a VectorBatch for snapshots of vectors
+        """
+        checkpoint = _read_checkpoint(path)
+        if checkpoint is None or checkpoint['version'] != _VERSION:
+            raise ValueError(f"{path} is not a snapshot directory")
+        if not checkpoint['complete']:
+            raise ValueError(f"Snapshot in {path} is incomplete, call export_snapshot again to resume it")
+        if output not in ('object', 'tensor'):
+            raise ValueError(f"Unknown output mode: {output}")
+        if output == 'tensor' and checkpoint['dimension'] is None:
+            raise ValueError("Tensor output mode requires a snapshot of vectors")
+        self._path = path
+        self._transform = transform
+        self._output = output
+        self._count = checkpoint['count']
+        self._dimension = checkpoint['dimension']
+        self._identity_name = checkpoint['identity']
+        self._length_ttl = 0
+        self._files = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_files'] = None
+        return state
+
+    def _open(self):
+        if self._files is None:
+            files = {}
+            for name in (_RECORDS, _OFFSETS, _VECTORS):
+                with open(os.path.join(self._path, name), 'rb') as f:
+                    # Empty files can not be mapped
+                    files[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if os.fstat(f.fileno()).st_size else b''
+            offsets = memoryview(files[_OFFSETS]).cast('Q') if files[_OFFSETS] else []
+            vectors = None
+            if self._dimension:
+                vectors = torch.frombuffer(files[_VECTORS], dtype=torch.float32).view(self._count, self._dimension)
+            self._files = (files[_RECORDS], offsets, vectors)
+        return self._files
+
+    def _identity(self):
+        return f'snapshot:{self._identity_name}'
+
+    def _length(self):
+        return self._count
+
+    def vectors(self) -> torch.Tensor:
+        """
+        :return: Tensor of shape [length, dimension] mapped from the snapshot file, without copying
+        """
+        if self._dimension is None:
+            raise ValueError("Snapshot does not hold vectors")
+        return self._open()[2]
+
+    def _read(self, idx: int):
+        records, offsets, vectors = self._open()
+        if idx < 0:
+            idx += self._count
+        if idx < 0 or idx >= self._count:
+            raise IndexError("Index out of range")
+        sample = pickle.loads(records[offsets[idx - 1] if idx > 0 else 0:offsets[idx]])
+        if vectors is not None:
+            sample = dataclasses.replace(sample, vector=vectors[idx] if self._output == 'tensor' else vectors[idx].tolist())
+        return sample
+
+    def _fetch_item(self, idx):
+        return self._read(idx)
+
+    def _fetch_chunk(self, idx):
+        return [self._read(i) for i in idx]
+
+    def _to_batch(self, samples) -> VectorBatch:
+        return VectorBatch(
+            ids=[v.id for v in samples],
+            vectors=torch.stack([v.vector for v in samples]),
+            metadata=[v.metadata for v in samples],
+            data=[v.data for v in samples],
+        )
+
+    def _transform_item(self, sample):
+        if self._output == 'tensor':
+            return _first_row(self._transform(self._to_batch([sample])))
+        return self._transform(sample)
+
+    def _transform_items(self, samples):
+        if self._output == 'tensor':
+            return self._transform(self._to_batch(samples))
+        return [self._transform(i) for i in samples]
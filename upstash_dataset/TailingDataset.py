@@ -0,0 +1,239 @@
+import random
+import time
+from typing import Callable, Iterator, List, Optional
+
+import upstash_redis
+import upstash_vector
+from torch.utils.data import IterableDataset
+
+from upstash_dataset.BaseDataset import identity
+from upstash_dataset.Clients import lazy_client
+from upstash_dataset.Sharding import get_shard_info
+
+
+class _TailingDataset(IterableDataset):
+    """
+    Base class for the tailing datasets
+
+    Subclasses implement _tail, a generator yielding the new samples of the current shard, or an empty list once the shard has read everything appended so far, _size, returning the total number of samples, and _advance, moving the position returned by state_dict past a sample.
+    The position is advanced for every new sample right before it is yielded, so that a state_dict taken between two samples resumes from the first sample not returned yet.
+    Iteration polls for new samples, waiting poll_interval after an empty poll and doubling the wait up to max_poll_interval.
+    It ends once the shard read no new sample and the total number of samples did not change for max_idle seconds, so that a shard waiting for its next page keeps polling while other shards are still receiving samples.
+    With a replay buffer, a uniform sample of the samples read so far is kept by reservoir sampling, and replay_ratio samples are drawn from it after every new sample on average.
+    """
+    _transform: Callable
+    _poll_interval: float
+    _max_poll_interval: float
+    _max_idle: Optional[float]
+    _replay_buffer: int
+    _replay_ratio: float
+    _seed: int
+
+    def _tail(self, shard_id: int, num_shards: int) -> Iterator[List]:
+        raise NotImplementedError
+
+    def _size(self) -> int:
+        raise NotImplementedError
+
+    def _advance(self, sample):
+        raise NotImplementedError
+
+    def __iter__(self):
+        shard_id, num_shards = get_shard_info()
+        rng = random.Random(self._seed + shard_id)
+        replay = []
+        seen = 0
+        credit = 0.0
+        interval = self._poll_interval
+        last_activity = time.monotonic()
+        last_size = None
+        for samples in self._tail(shard_id, num_shards):
+            if not samples:
+                if self._max_idle is not None:
+                    size = self._size()
+                    if size != last_size:
+                        last_size = size
+                        last_activity = time.monotonic()
+                    elif time.monotonic() - last_activity >= self._max_idle:
+                        return
+                time.sleep(interval)
+                interval = min(interval * 2, self._max_poll_interval)
+                continue
+            interval = self._poll_interval
+            for sample in samples:
+                if num_shards == 1:
+                    self._advance(sample)
+                yield self._transform(sample)
+                if self._replay_buffer <= 0:
+                    continue
+                if replay:
+                    credit += self._replay_ratio
+                    while credit >= 1:
+                        credit -= 1
+                        yield self._transform(rng.choice(replay))
+                seen += 1
+                if len(replay) < self._replay_buffer:
+                    replay.append(sample)
+                else:
+                    j = rng.randrange(seen)
+                    if j < self._replay_buffer:
+                        replay[j] = sample
+            last_activity = time.monotonic()
+
+
+class RedisListTailingDataset(_TailingDataset):
+    """
+    Tailing dataset class for Upstash Redis List
+
+    This class reads the elements appended to a list while it is iterated, for online training on a list that keeps growing with RPUSH. Only the elements after the last read offset are fetched, with LRANGE.
+    The list is split into pages of page_size elements starting at the first read offset, and pages are split between DataLoader workers and torch.distributed ranks without overlap.
+    Offsets are positions in the list, so elements must not be removed from its head while it is tailed.
+    """
+    def __init__(self, redis: upstash_redis.Redis, key: str, transform: Callable = identity, start: Optional[int] = None,
+                 page_size: int = 1000, poll_interval: float = 0.1, max_poll_interval: float = 5.0, max_idle: Optional[float] = None,
+                 replay_buffer: int = 0, replay_ratio: float = 0.0, seed: int = 0):
+        """
+        :param redis: Upstash Redis client
+        :param key: Redis key to the list
+        :param transform: Function to transform the element before returning
+        :param start: Offset of the first element to read, None to read only the elements appended after the dataset is created
+        :param page_size: Maximum number of elements fetched with each LRANGE call
+        :param poll_interval: Seconds to wait after a poll without new elements
+        :param max_poll_interval: Maximum seconds to wait between polls, the wait doubles after every empty poll
+        :param max_idle: Seconds without new elements in the list after which iteration ends, None to iterate indefinitely
+        :param replay_buffer: Number of read elements kept to be replayed, 0 to disable replay
+        :param replay_ratio: Average number of replayed elements yielded after every new element
+        :param seed: Seed of the replay sampling
+        """
+        self._redis = lazy_client(redis)
+        self._key = key
+        self._transform = transform
+        # Workers have to agree on the first offset to split the pages between them, and forked workers do not pickle the dataset
+        self._offset = redis.llen(key) if start is None else start
+        self._page_size = page_size
+        self._poll_interval = poll_interval
+        self._max_poll_interval = max_poll_interval
+        self._max_idle = max_idle
+        self._replay_buffer = replay_buffer
+        self._replay_ratio = replay_ratio
+        self._seed = seed
+
+    def state_dict(self) -> dict:
+        """
+        :return: Offset of the next element to read, valid when the dataset is iterated in the main process
+        """
+        return {"offset": self._offset}
+
+    def load_state_dict(self, state: dict):
+        """
+        :param state: State returned by state_dict to resume reading from
+        """
+        self._offset = state["offset"]
+
+    def _size(self):
+        return self._redis.llen(self._key)
+
+    def _advance(self, sample):
+        self._offset += 1
+
+    def _tail(self, shard_id, num_shards):
+        start = self._offset
+        page = shard_id
+        consumed = 0
+        while True:
+            first = start + page * self._page_size
+            values = self._redis.lrange(self._key, first + consumed, first + self._page_size - 1)
+            consumed += len(values)
+            if consumed >= self._page_size:
+                page += num_shards
+                consumed = 0
+            yield values
+
+
+class VectorTailingDataset(_TailingDataset):
+    """
+    Tailing dataset class for Upstash Vector Index
+
+    This class follows a namespace with the range API while it is iterated, for online training on a namespace that keeps growing. The cursor of the last page is kept, and only the vectors of that page which were not read yet are fetched.
+    Vectors are found in the order of the range API, so they should be upserted with increasing IDs, such as zero-padded counters or timestamps. Vectors inserted before the cursor are not picked up.
+    Pages are split between DataLoader workers and torch.distributed ranks without overlap, like in VectorIterableDataset.
+    """
+    def __init__(self, index: upstash_vector.Index, namespace: str = "", transform: Callable = identity,
+                 include_vectors: bool = True, include_metadata: bool = True, include_data: bool = False,
+                 cursor: str = "", page_size: int = 1000, poll_interval: float = 0.1, max_poll_interval: float = 5.0,
+                 max_idle: Optional[float] = None, replay_buffer: int = 0, replay_ratio: float = 0.0, seed: int = 0):
+        """
+        :param index: Upstash Vector Index
+        :param namespace: Namespace of the vectors in the index
+        :param transform: Function to transform the retrieved vector before returning
+        :param include_vectors: Whether to include vectors in the fetch
+        :param include_metadata: Whether to include metadata in the fetch
+        :param include_data: Whether to include data in the fetch
+        :param cursor: Range cursor to start reading from, as returned in state_dict
+        :param page_size: Number of vectors listed with each range request
+        :param poll_interval: Seconds to wait after a poll without new vectors
+        :param max_poll_interval: Maximum seconds to wait between polls, the wait doubles after every empty poll
+        :param max_idle: Seconds without new vectors in the namespace after which iteration ends, None to iterate indefinitely
+        :param replay_buffer: Number of read vectors kept to be replayed, 0 to disable replay
+        :param replay_ratio: Average number of replayed vectors yielded after every new vector
+        :param seed: Seed of the replay sampling
+        """
+        self._index = lazy_client(index)
+        self._namespace = namespace
+        self._transform = transform
+        self._options = {"include_vectors": include_vectors, "include_metadata": include_metadata, "include_data": include_data}
+        self._page_size = page_size
+        self._poll_interval = poll_interval
+        self._max_poll_interval = max_poll_interval
+        self._max_idle = max_idle
+        self._replay_buffer = replay_buffer
+        self._replay_ratio = replay_ratio
+        self._seed = seed
+        self._position = {"cursor": cursor, "page": 0, "seen": []}
+
+    def state_dict(self) -> dict:
+        """
+        :return: Cursor of the last page and the IDs already read from it, valid when the dataset is iterated in the main process
+        """
+        return {"cursor": self._position["cursor"], "page": self._position["page"], "seen": list(self._position["seen"])}
+
+    def load_state_dict(self, state: dict):
+        """
+        :param state: State returned by state_dict to resume reading from
+        """
+        self._position = {"cursor": state["cursor"], "page": state["page"], "seen": list(state["seen"])}
+
+    def _size(self):
+        namespace = self._index.info().namespaces.get(self._namespace)
+        return 0 if namespace is None else namespace.vector_count
+
+    def _advance(self, sample):
+        self._position["seen"].append(sample.id)
+
+    def _tail(self, shard_id, num_shards):
+        cursor, page, seen = self._position["cursor"], self._position["page"], set(self._position["seen"])
+        while True:
+            # Pages partly read before are listed with IDs only, so that only their new vectors are transferred
+            listing = num_shards > 1 or bool(seen)
+            if listing:
+                result = self._index.range(cursor=cursor, limit=self._page_size, namespace=self._namespace,
+                                           include_vectors=False, include_metadata=False, include_data=False)
+            else:
+                result = self._index.range(cursor=cursor, limit=self._page_size, namespace=self._namespace, **self._options)
+            vectors = [v for v in result.vectors if v.id not in seen]
+            if page % num_shards != shard_id:
+                vectors = []
+            if listing and vectors:
+                vectors = self._index.fetch(ids=[v.id for v in vectors], namespace=self._namespace, **self._options)
+                vectors = [v for v in vectors if v is not None]
+            advanced = bool(result.next_cursor)
+            # Pages of other shards are skipped without waiting, an empty list only means the tail was reached
+            if vectors or not advanced:
+                yield vectors
+            if advanced:
+                # The position moves to the next page once the vectors of this page were yielded
+                cursor, page, seen = result.next_cursor, page + 1, set()
+                if num_shards == 1:
+                    self._position = {"cursor": cursor, "page": page, "seen": []}
+            else:
+                seen.update(v.id for v in result.vectors)
@@ -1,18 +1,60 @@
-from typing import Callable
+from typing import Callable, List, Mapping, NamedTuple, Optional
 
-from torch.utils.data import Dataset
+import torch
 import upstash_vector
 
+from upstash_dataset.BaseDataset import UpstashDataset, identity
+from upstash_dataset.Chunking import AdaptiveChunker
+from upstash_dataset.Clients import client_url, lazy_client
+from upstash_dataset.Metrics import Metrics
+from upstash_dataset.Retry import RetryPolicy
 
-class VectorDataset(Dataset):
+
+class VectorBatch(NamedTuple):
+    """
+    Batch of vectors decoded into a single tensor
+
+    Rows of vectors correspond to the entries of ids, metadata and data. A single sample, as returned by row, holds the entries of its row instead of lists and a vector of shape [dimension].
+    """
+    ids: List[str]
+    vectors: torch.Tensor
+    metadata: List
+    data: List
+
+    def row(self, i: int) -> 'VectorBatch':
+        """
+        :param i: Position of the sample in the batch
+        :return: Sample at position i
+        """
+        return VectorBatch(ids=self.ids[i], vectors=self.vectors[i], metadata=self.metadata[i], data=self.data[i])
+
+
+def _first_row(batch):
+    """
+    :param batch: Transformed batch of one sample, such as a VectorBatch, a tensor, or a mapping or tuple of them
+    :return: Its only sample, without the batch dimension
+    """
+    if isinstance(batch, VectorBatch):
+        return batch.row(0)
+    if isinstance(batch, Mapping):
+        return {key: _first_row(value) for key, value in batch.items()}
+    if isinstance(batch, tuple):
+        return tuple(_first_row(value) for value in batch)
+    return batch[0]
+
+
+class VectorDataset(UpstashDataset):
     """
     Dataset class for Upstash Vector Index
 
     This class allows you to use Upstash Vector Index as a PyTorch Dataset and allows easy integration for training models.
+    With output set to 'tensor', fetched vectors are decoded into a VectorBatch holding one contiguous tensor of shape [batch, dimension] and the transform is applied to the whole batch. __getitem__ applies the transform to a batch of one sample and returns its first row, taken from every value of a mapping or tuple returned by the transform. Use batch_collate as the collate function of the DataLoader in that mode.
     """
     def __init__(self, index : upstash_vector.Index, namespace: str = "",
-                 id_mapping: Callable = lambda x: str(x), transform: Callable[[upstash_vector.Vector], any] = lambda x: x,
-                 include_vectors: bool = True, include_metadata: bool = True, include_data: bool = False):
+                 id_mapping: Callable = str, transform: Callable[[upstash_vector.Vector], any] = identity,
+                 include_vectors: bool = True, include_metadata: bool = True, include_data: bool = False,
+                 length_ttl: Optional[float] = None, output: str = 'object', dtype: torch.dtype = torch.float32,
+                 chunker: Optional[AdaptiveChunker] = None, metrics: Optional[Metrics] = None, retry: Optional[RetryPolicy] = None):
         """
         :param index: Upstash Vector Index
         :param namespace: Namespace of the vectors in the index
@@ -21,25 +63,62 @@ class VectorDataset(Dataset):
         :param include_vectors: Whether to include vectors in the fetch
         :param include_metadata: Whether to include metadata in the fetch
         :param include_data: Whether to include data in the fetch
+        :param length_ttl: Seconds to cache the length for, None to cache it until refresh or set_epoch is called and 0 to disable caching
+        :param output: 'object' to return a FetchResult per sample, 'tensor' to return a VectorBatch
+        :param dtype: Data type of the vectors tensor in tensor output mode
+        :param chunker: Splits batches into concurrently fetched chunks sized by the observed response sizes, None to fetch each batch with a single request
+        :param metrics: Records the timings and sizes of requests, None to disable instrumentation
+        :param retry: Retries, splits and hedges failed or slow requests, None to fail on the first error
         """
-        self._index = index
+        if output not in ('object', 'tensor'):
+            raise ValueError(f"Unknown output mode: {output}")
+        if output == 'tensor' and not include_vectors:
+            raise ValueError("Tensor output mode requires include_vectors")
+        self._index = lazy_client(index)
         self._namespace = namespace
         self._id_mapping = id_mapping
         self._transform = transform
         self._options = {"include_vectors": include_vectors, "include_metadata": include_metadata, "include_data": include_data}
+        self._length_ttl = length_ttl
+        self._chunker = chunker
+        self._metrics = metrics
+        self._retry = retry
+        self._output = output
+        self._dtype = dtype
 
-    def __len__(self):
+    def _identity(self):
+        return f'vector:{client_url(self._index)}:{self._namespace}'
+
+    def _length(self):
         info = self._index.info()
         return info.namespaces[self._namespace].vector_count
 
-    def __getitem__(self, idx):
-        vectors = self._index.fetch(ids=self._id_mapping(idx), namespace=self._namespace, **self._options)
+    def _fetch_item(self, idx):
+        vectors = self._timed_fetch(lambda: self._index.fetch(ids=self._id_mapping(idx), namespace=self._namespace, **self._options), 1)
         if len(vectors) == 0 or vectors[0] is None:
             raise IndexError("Index out of range")
-        return self._transform(vectors[0])
+        return vectors[0]
 
-    def __getitems__(self, idx):
-        vectors = self._index.fetch(ids=[self._id_mapping(i) for i in idx], namespace=self._namespace, **self._options)
+    def _fetch_chunk(self, idx):
+        vectors = self._timed_fetch(lambda: self._index.fetch(ids=[self._id_mapping(i) for i in idx], namespace=self._namespace, **self._options), len(idx))
         if None in vectors:
             raise IndexError("Index out of range")
-        return [self._transform(v) for v in vectors]
+        return vectors
+
+    def _to_batch(self, vectors) -> VectorBatch:
+        return VectorBatch(
+            ids=[v.id for v in vectors],
+            vectors=torch.tensor([v.vector for v in vectors], dtype=self._dtype),
+            metadata=[v.metadata for v in vectors],
+            data=[v.data for v in vectors],
+        )
+
+    def _transform_item(self, sample):
+        if self._output == 'tensor':
+            return _first_row(self._transform(self._to_batch([sample])))
+        return self._transform(sample)
+
+    def _transform_items(self, samples):
+        if self._output == 'tensor':
+            return self._transform(self._to_batch(samples))
+        return [self._transform(v) for v in samples]
@@ -0,0 +1,111 @@
+import random
+from typing import Callable, Iterator, Tuple
+
+import upstash_vector
+from torch.utils.data import IterableDataset
+
+from upstash_dataset.BaseDataset import identity
+from upstash_dataset.Clients import lazy_client
+from upstash_dataset.Sharding import get_shard_info
+
+
+class VectorIterableDataset(IterableDataset):
+    """
+    Streaming dataset class for Upstash Vector Index
+
+    This class walks a whole namespace with the range API in large pages, so that no index-to-ID mapping is needed and vectors are read sequentially.
+    Pages are split between DataLoader workers and torch.distributed ranks without overlap. When there is more than one shard, pages are listed with IDs only and each shard fetches the vectors of its own pages.
+    """
+    def __init__(self, index: upstash_vector.Index, namespace: str = "", transform: Callable = identity,
+                 include_vectors: bool = True, include_metadata: bool = True, include_data: bool = False,
+                 page_size: int = 1000, shuffle_buffer: int = 0, seed: int = 0, cursor: str = ""):
+        """
+        :param index: Upstash Vector Index
+        :param namespace: Namespace of the vectors in the index
+        :param transform: Function to transform the retrieved vector before returning
+        :param include_vectors: Whether to include vectors in the fetch
+        :param include_metadata: Whether to include metadata in the fetch
+        :param include_data: Whether to include data in the fetch
+        :param page_size: Number of vectors fetched with each range request
+        :param shuffle_buffer: Size of the buffer vectors are shuffled in, 0 to keep the order of the index
+        :param seed: Seed of the shuffle, combined with the epoch set by set_epoch
+        :param cursor: Range cursor to start reading from, as returned in state_dict
+        """
+        self._index = lazy_client(index)
+        self._namespace = namespace
+        self._transform = transform
+        self._options = {"include_vectors": include_vectors, "include_metadata": include_metadata, "include_data": include_data}
+        self._page_size = page_size
+        self._shuffle_buffer = shuffle_buffer
+        self._seed = seed
+        self._epoch = 0
+        self._position = {"cursor": cursor, "page": 0}
+
+    def set_epoch(self, epoch: int):
+        """
+        :param epoch: Epoch number, used to shuffle differently in every epoch
+        """
+        self._epoch = epoch
+
+    def state_dict(self) -> dict:
+        """
+        :return: Cursor of the oldest page that may hold vectors not yielded yet, valid when the dataset is iterated in the main process. Vectors of that page and of the pages after it which were already yielded are read again on resume.
+        """
+        return dict(self._position)
+
+    def load_state_dict(self, state: dict):
+        """
+        :param state: State returned by state_dict to resume reading from
+        """
+        self._position = dict(state)
+
+    def _pages(self, shard_id: int, num_shards: int) -> Iterator[Tuple[int, str, str, list]]:
+        """
+        :return: Generator of the page number, its cursor, the cursor of the next page, empty after the last page, and the vectors of this shard
+        """
+        cursor, page = self._position["cursor"], self._position["page"]
+        while True:
+            if num_shards == 1:
+                result = self._index.range(cursor=cursor, limit=self._page_size, namespace=self._namespace, **self._options)
+                vectors = result.vectors
+            else:
+                result = self._index.range(cursor=cursor, limit=self._page_size, namespace=self._namespace,
+                                           include_vectors=False, include_metadata=False, include_data=False)
+                vectors = []
+                if page % num_shards == shard_id and result.vectors:
+                    vectors = self._index.fetch(ids=[v.id for v in result.vectors], namespace=self._namespace, **self._options)
+                    vectors = [v for v in vectors if v is not None]
+            next_cursor = result.next_cursor if result.vectors else ""
+            yield page, cursor, next_cursor, vectors
+            if not next_cursor:
+                break
+            cursor, page = next_cursor, page + 1
+
+    def __iter__(self):
+        shard_id, num_shards = get_shard_info()
+        rng = random.Random(self._seed + self._epoch)
+        # Buffered vectors are kept with the number of their page, whose cursor is kept until the page leaves the buffer
+        buffer = []
+        cursors = {}
+        for page, cursor, next_cursor, vectors in self._pages(shard_id, num_shards):
+            cursors[page] = cursor
+            for vector in vectors:
+                if self._shuffle_buffer <= 0:
+                    yield self._transform(vector)
+                    continue
+                if len(buffer) < self._shuffle_buffer:
+                    buffer.append((page, vector))
+                    continue
+                i = rng.randrange(len(buffer))
+                yield self._transform(buffer[i][1])
+                buffer[i] = (page, vector)
+            oldest = min((p for p, _ in buffer), default=None)
+            if oldest is not None:
+                self._position = {"cursor": cursors[oldest], "page": oldest}
+            elif next_cursor:
+                self._position = {"cursor": next_cursor, "page": page + 1}
+            cursors = {p: c for p, c in cursors.items() if oldest is not None and p >= oldest}
+        rng.shuffle(buffer)
+        for _, vector in buffer:
+            yield self._transform(vector)
+        self._position = {"cursor": "", "page": 0}
@@ -0,0 +1,149 @@
+import bisect
+from typing import Callable, List, Optional, Tuple
+
+import upstash_redis
+
+from upstash_dataset.BaseDataset import UpstashDataset, identity
+from upstash_dataset.Clients import client_url, lazy_client
+
+
+class RedisSortedSetWindowDataset(UpstashDataset):
+    """
+    Sliding window dataset class for Upstash Redis Sorted Set
+
+    This class treats a sorted set as a log ordered by score, such as events scored by timestamp, and holds the members whose score is within window of the end of the window.
+    The members of the window are kept in memory. advance moves the end of the window, fetching only the members added after the last fetched score with ZRANGEBYSCORE calls paged by score and dropping the members that left the window.
+    The window advances to the highest score in the sorted set whenever a new epoch is set with set_epoch, and before the first access. Members added later with a score below the last fetched score are not picked up.
+    Only the bounds of the window are pickled, and DataLoader workers started with spawn or forkserver fetch its members again on first access, so members added to or removed from the window after it advanced change what they read.
+    """
+    def __init__(self, redis: upstash_redis.Redis, key: str, window: Optional[float] = None, transform: Callable = identity, page_size: int = 1000):
+        """
+        :param redis: Upstash Redis client
+        :param key: Redis key to the sorted set
+        :param window: Width of the window in score units, None to keep every member up to the end of the window
+        :param transform: Function to transform the (member, score) tuple before returning
+        :param page_size: Number of members fetched with each ZRANGEBYSCORE call
+        """
+        self._redis = lazy_client(redis)
+        self._key = key
+        self._window = window
+        self._transform = transform
+        self._page_size = page_size
+        self._members: List[Tuple[str, float]] = []
+        self._scores: List[float] = []
+        self._start = 0
+        self._end: Optional[float] = None
+        self._length_ttl = 0
+
+    def __getstate__(self):
+        # Workers receive the bounds of the window of the main process instead of advancing their own
+        if self._end is None:
+            self.advance()
+        state = super().__getstate__()
+        if self._end is not None:
+            # The window of an empty sorted set has no bounds to fetch from, and is pickled empty
+            state['_members'], state['_scores'], state['_start'] = None, None, 0
+        return state
+
+    def _load(self):
+        """
+        Fetches the members of the window from its bounds if they were not pickled
+        """
+        if self._members is None:
+            self._members, self._scores = [], []
+            floor = self.window()[0]
+            self._fetch_scores('-inf' if floor is None else f'({floor!r}', self._end, None, set())
+
+    def _identity(self):
+        return f'zset-window:{client_url(self._redis)}:{self._key}:{self._window}'
+
+    def _length(self):
+        if self._end is None:
+            self.advance()
+        self._load()
+        return len(self._members) - self._start
+
+    def refresh(self):
+        self.advance()
+
+    def window(self) -> Tuple[Optional[float], Optional[float]]:
+        """
+        :return: Exclusive start and inclusive end of the scores in the window
+        """
+        if self._end is None or self._window is None:
+            return None, self._end
+        return self._end - self._window, self._end
+
+    def advance(self, end: Optional[float] = None) -> int:
+        """
+        Moves the end of the window and fetches the members added since the last call
+
+        :param end: New end of the window, defaults to the highest score in the sorted set
+        :return: Number of members added to the window
+        """
+        if end is None:
+            last = self._redis.zrange(self._key, -1, -1, withscores=True)
+            if not last:
+                return 0
+            end = last[0][1]
+        if self._end is not None and end < self._end:
+            raise ValueError(f"Window can not move back from {self._end} to {end}")
+        floor = None if self._window is None else end - self._window
+        self._load()
+        if self._scores and (floor is None or self._scores[-1] > floor):
+            # Continue from the last fetched score, skipping the members already fetched with that score
+            last = self._scores[-1]
+            ties = set()
+            i = len(self._scores)
+            while i > self._start and self._scores[i - 1] == last:
+                i -= 1
+                ties.add(self._members[i][0])
+            added = self._fetch_scores(repr(last), end, last, ties)
+        else:
+            self._members, self._scores, self._start = [], [], 0
+            added = self._fetch_scores('-inf' if floor is None else f'({floor!r}', end, None, set())
+        self._end = end
+        if floor is not None:
+            self._start = bisect.bisect_right(self._scores, floor, self._start)
+        if self._start > len(self._members) // 2:
+            del self._members[:self._start]
+            del self._scores[:self._start]
+            self._start = 0
+        self._length_cache = None
+        return added
+
+    def _fetch_scores(self, min_score: str, end: float, last: Optional[float], ties: set) -> int:
+        """
+        Appends the members from min_score to end, paging by score so that every page is a ZRANGEBYSCORE without offset
+
+        :param min_score: Lower bound of the first page
+        :param end: Inclusive upper bound
+        :param last: Score of the last fetched member, None if no member was fetched
+        :param ties: Members already fetched with score last
+        :return: Number of members appended
+        """
+        added = 0
+        while True:
+            # Each page starts at the last fetched score, requesting enough members to get past the ones already fetched with it
+            count = self._page_size + len(ties)
+            page = self._redis.zrangebyscore(self._key, min_score if last is None else repr(last), repr(end), withscores=True, offset=0, count=count)
+            for member, score in page:
+                if score == last and member in ties:
+                    continue
+                if score != last:
+                    last, ties = score, set()
+                ties.add(member)
+                self._members.append((member, score))
+                self._scores.append(score)
+                added += 1
+            if len(page) < count:
+                return added
+
+    def _fetch_item(self, idx):
+        length = len(self)
+        if idx < -length or idx >= length:
+            raise IndexError("Index out of range")
+        return self._members[self._start + idx % length]
+
+    def _fetch_chunk(self, idx):
+        return [self._fetch_item(i) for i in idx]
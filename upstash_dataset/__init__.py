@@ -1,12 +1,58 @@
 from upstash_dataset.RedisDataset import RedisStringDataset, RedisListDataset, RedisSortedSetDataset, RedisJsonObjectDataset, RedisJsonArrayDataset
 
-from upstash_dataset.VectorDataset import VectorDataset
+from upstash_dataset.WindowDataset import RedisSortedSetWindowDataset
+from upstash_dataset.VectorDataset import VectorDataset, VectorBatch
+from upstash_dataset.VectorIterableDataset import VectorIterableDataset
+from upstash_dataset.TailingDataset import RedisListTailingDataset, VectorTailingDataset
+
+from upstash_dataset.AsyncDataset import AsyncRedisStringDataset, AsyncRedisListDataset, AsyncRedisSortedSetDataset, AsyncRedisJsonObjectDataset, AsyncRedisJsonArrayDataset, AsyncVectorDataset
+
+from upstash_dataset.CachedDataset import CachedDataset
+from upstash_dataset.Snapshot import SnapshotDataset, export_snapshot
+from upstash_dataset.Chunking import AdaptiveChunker
+from upstash_dataset.Codec import Codec, ArrayCodec, MsgpackCodec, write_list, write_strings
+from upstash_dataset.Metrics import Metrics
+from upstash_dataset.Clients import LazyClient
+from upstash_dataset.Retry import RetryPolicy
+from upstash_dataset.KeyIndex import KeyIndex
+from upstash_dataset.Collate import batch_collate
+from upstash_dataset.Prefetcher import PrefetchLoader
+from upstash_dataset.Sharding import BlockShardSampler
+from upstash_dataset.LocalUpstash import LocalUpstashServer
 
 __all__ = [
     'VectorDataset',
+    'VectorBatch',
+    'VectorIterableDataset',
+    'VectorTailingDataset',
     'RedisListDataset',
     'RedisStringDataset',
     'RedisSortedSetDataset',
+    'RedisSortedSetWindowDataset',
+    'RedisListTailingDataset',
     'RedisJsonArrayDataset',
     'RedisJsonObjectDataset',
+    'AsyncVectorDataset',
+    'AsyncRedisListDataset',
+    'AsyncRedisStringDataset',
+    'AsyncRedisSortedSetDataset',
+    'AsyncRedisJsonArrayDataset',
+    'AsyncRedisJsonObjectDataset',
+    'CachedDataset',
+    'SnapshotDataset',
+    'export_snapshot',
+    'AdaptiveChunker',
+    'Codec',
+    'ArrayCodec',
+    'MsgpackCodec',
+    'write_list',
+    'write_strings',
+    'Metrics',
+    'LazyClient',
+    'RetryPolicy',
+    'KeyIndex',
+    'PrefetchLoader',
+    'BlockShardSampler',
+    'batch_collate',
+    'LocalUpstashServer',
 ]
\ No newline at end of file